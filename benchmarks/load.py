@@ -0,0 +1,173 @@
+"""
+Load test of the upload endpoint of a running server: concurrent clients upload a synthetic
+statement PDF, poll their job until it is settled and, when turned away with a 429, wait for its
+Retry-After before uploading again. Every upload is a distinct copy (a comment appended after the
+PDF trailer) so the content cache never answers. Reports the response codes, the job outcomes,
+the upload and end-to-end latencies, the jobs per second and the peaks of the queue depth, running
+jobs and pixels in flight read from /metrics during the run, with the rejections and timeouts.
+
+Usage: python -m benchmarks.load [--url http://127.0.0.1:8000] [--clients 16] [--uploads 64]
+                                 [--transactions 40] [--dpi 200] [--poll 0.5] [--no-retry]
+"""
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+
+from collections import Counter, defaultdict
+
+import httpx
+
+from benchmarks.synthetic import SyntheticStatement
+
+FINISHED = ("done", "failed", "cancelled")
+GAUGES = ("job_queue_depth", "jobs_running", "ocr_pixels_in_flight")
+COUNTERS = ("admission_rejected_total", "stage_timeouts_total")
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, round(q * (len(values) - 1)))]
+
+
+def scrape(text: str) -> dict:
+    """
+    The GAUGES and COUNTERS of a Prometheus text page, series by series.
+    """
+    values = {}
+    for line in text.splitlines():
+        if line.startswith("#") or not line.startswith(GAUGES + COUNTERS):
+            continue
+        series, _, value = line.rpartition(" ")
+        values[series] = float(value)
+    return values
+
+
+class LoadTest:
+    def __init__(self, url: str, content: bytes, clients: int, uploads: int, poll: float, retry: bool) -> None:
+        self.url = url
+        self.content = content
+        self.clients = clients
+        self.uploads = uploads
+        self.poll = poll
+        self.retry = retry
+        self.codes = Counter()
+        self.outcomes = Counter()
+        self.latencies = defaultdict(list)
+        self.peaks = Counter()
+        self.counters = {}
+
+    async def run(self) -> float:
+        start = time.perf_counter()
+        indices = iter(range(self.uploads))
+        async with httpx.AsyncClient(base_url=self.url, timeout=None) as http:
+            # fails right away when no server is listening
+            self.__record(scrape((await http.get("/metrics")).text))
+            monitor = asyncio.ensure_future(self.__monitor(http))
+            try:
+                await asyncio.gather(*[self.__client(http, indices) for _ in range(self.clients)])
+            finally:
+                monitor.cancel()
+                await asyncio.gather(monitor, return_exceptions=True)
+            await self.__scrape(http)
+        return time.perf_counter() - start
+
+    async def __client(self, http: httpx.AsyncClient, indices) -> None:
+        # the index iterator is shared, so each upload is sent by exactly one client
+        for index in indices:
+            await self.__upload(http, index)
+
+    async def __upload(self, http: httpx.AsyncClient, index: int) -> None:
+        start = time.perf_counter()
+        content = self.content + f"\n% load test upload {index}\n".encode()
+        while True:
+            sent = time.perf_counter()
+            try:
+                response = await http.post("/statements/upload/", files={"file": (f"load-{index}.pdf", content, "application/pdf")})
+            except httpx.TransportError:
+                # dropped connections are counted like a response code
+                self.codes["error"] += 1
+                return
+            self.latencies["upload"].append(time.perf_counter() - sent)
+            self.codes[str(response.status_code)] += 1
+            if response.status_code != 429 or not self.retry:
+                break
+            await asyncio.sleep(float(response.headers.get("retry-after", 1)))
+
+        if response.status_code != 202:
+            return
+
+        job_id = response.json()["id"]
+        while True:
+            await asyncio.sleep(self.poll)
+            job = (await http.get(f"/statements/jobs/{job_id}")).json()
+            if job["status"] in FINISHED:
+                break
+        self.outcomes[job["status"]] += 1
+        self.latencies["job"].append(time.perf_counter() - start)
+
+    async def __monitor(self, http: httpx.AsyncClient) -> None:
+        while True:
+            await self.__scrape(http)
+            await asyncio.sleep(0.25)
+
+    async def __scrape(self, http: httpx.AsyncClient) -> None:
+        try:
+            self.__record(scrape((await http.get("/metrics")).text))
+        except httpx.TransportError:
+            pass # a missed sample only makes the peaks less precise
+
+    def __record(self, values: dict) -> None:
+        for series, value in values.items():
+            if series.startswith(GAUGES):
+                self.peaks[series] = max(self.peaks[series], value)
+            else:
+                self.counters[series] = value
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--uploads", type=int, default=64)
+    parser.add_argument("--transactions", type=int, default=40)
+    parser.add_argument("--dpi", type=int, default=200)
+    parser.add_argument("--poll", type=float, default=0.5)
+    parser.add_argument("--no-retry", dest="retry", action="store_false", help="don't upload again after a 429")
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    try:
+        SyntheticStatement(args.transactions).save_pdf(path, args.dpi)
+        with open(path, "rb") as pdf:
+            content = pdf.read()
+    finally:
+        os.remove(path)
+
+    test = LoadTest(args.url, content, args.clients, args.uploads, args.poll, args.retry)
+    try:
+        elapsed = asyncio.run(test.run())
+    except httpx.ConnectError:
+        print(f"skipped (no server at {args.url})")
+        return
+
+    print(f"{args.uploads} uploads from {args.clients} clients in {elapsed:.1f}s, "
+          f"{sum(test.outcomes.values()) / elapsed:.2f} jobs/s")
+    print("responses: " + ", ".join(f"{code}: {count}" for code, count in sorted(test.codes.items())))
+    print("jobs:      " + ", ".join(f"{status}: {count}" for status, count in sorted(test.outcomes.items())))
+    for name, values in test.latencies.items():
+        print(f"{name + ' s':<10} p50 {percentile(values, 0.5):.3f}  p99 {percentile(values, 0.99):.3f}  "
+              f"max {max(values):.3f}  mean {statistics.mean(values):.3f}")
+    for series, value in sorted(test.peaks.items()):
+        print(f"peak {series} {value:g}")
+    for series, value in sorted(test.counters.items()):
+        print(f"{series} {value:g}")
+
+
+if __name__ == "__main__":
+    main()
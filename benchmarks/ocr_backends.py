@@ -0,0 +1,53 @@
+"""
+Per-call OCR latency of each installed backend on a synthetic page: a small field crop (where the
+process spawn and model load of pytesseract dominate) and the full page. The first call of each
+backend is reported apart, as it includes loading the language model.
+
+Usage: python -m benchmarks.ocr_backends [--repeat 10] [--dpi 200]
+"""
+import time
+import argparse
+import statistics
+
+from benchmarks.synthetic import SyntheticStatement
+from webserver.ocr import BACKENDS
+from webserver.utils import RasterProfile
+
+
+def timed(backend, image, repeat: int) -> list:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        backend.image_to_data(image, config="--psm 6")
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--dpi", type=int, default=RasterProfile.BASE_DPI)
+    args = parser.parse_args()
+
+    page = SyntheticStatement(20).images(args.dpi)[0]
+    scale = args.dpi / RasterProfile.BASE_DPI
+    # the statement date field of the first page
+    crop = page.crop(tuple(round(side * scale) for side in (80, 90, 600, 140)))
+    images = {"crop": crop, "page": page}
+
+    print(f"{'backend':<12} {'image':<6} {'first':>8} {'median':>8} {'p95':>8}")
+    for name, backend_class in BACKENDS.items():
+        try:
+            backend = backend_class()
+            backend.warm_up()
+            for label, image in images.items():
+                first = timed(backend, image, 1)[0]
+                timings = sorted(timed(backend, image, args.repeat))
+                p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                print(f"{name:<12} {label:<6} {first:>8.4f} {statistics.median(timings):>8.4f} {p95:>8.4f}")
+        except Exception as e:
+            print(f"{name:<12} skipped ({type(e).__name__}: {e})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Compare the number of Tesseract calls and the wall time per page between the
+legacy multi-pass extraction and the single-pass extraction. Calls are counted
+through the OCR backend, whichever it is (pytesseract or tesserocr).
+
+Usage: python -m benchmarks.ocr_passes converted_test_pdf_1.PNG [more pages ...]
+"""
+import sys
+import time
+
+from collections import Counter
+from webserver.metrics import metrics
+from webserver.ocr import ocr_backend
+from webserver.utils import StatementExtractor
+
+
+def run(path: str, single_pass: bool) -> dict:
+    extractor = StatementExtractor(path, single_pass=single_pass)
+    start = time.perf_counter()
+    # every OcrBackend call records a tesseract sample, labelled with the function called
+    with metrics.collect() as samples:
+        extractor.extract()
+    elapsed = time.perf_counter() - start
+
+    calls = Counter()
+    for kind, labels, value in samples:
+        if kind == "tesseract":
+            calls[dict(labels)["call"]] += value
+    return {"calls": int(sum(calls.values())), "detail": {name: int(count) for name, count in calls.items()}, "seconds": elapsed}
+
+
+def main(paths: list) -> None:
+    print(f"OCR backend: {ocr_backend.name}")
+    print(f"{'page':<40} {'mode':<12} {'calls':>5} {'seconds':>9}")
+    for path in paths:
+        for mode, single_pass in (("multi-pass", False), ("single-pass", True)):
+            result = run(path, single_pass)
+            print(f"{path:<40} {mode:<12} {result['calls']:>5} {result['seconds']:>9.3f}  {result['detail']}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(2)
+    main(sys.argv[1:])
@@ -0,0 +1,46 @@
+"""
+Throughput of the process-pool extraction engine against the number of workers.
+
+Usage: python -m benchmarks.ocr_workers converted_test_pdf_1.PNG [more pages ...] [--pages 16]
+"""
+import os
+import sys
+import time
+import argparse
+
+from webserver.engine import ExtractionEngine
+from webserver.utils import Utils
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("images", nargs="+")
+    parser.add_argument("--pages", type=int, default=16, help="pages per run, the images are repeated to fill it")
+    args = parser.parse_args()
+
+    sources = [Utils.open_image(path, raise_exception=True) for path in args.images]
+    for image in sources:
+        image.load()
+    pages = [sources[i % len(sources)] for i in range(args.pages)]
+
+    cpu_count = os.cpu_count() or 1
+    counts = sorted({1, 2, 4, 8, 16, cpu_count} & set(range(1, cpu_count + 1)))
+
+    print(f"{'workers':>7} {'omp':>4} {'seconds':>9} {'pages/s':>8}")
+    for workers in counts:
+        engine = ExtractionEngine(workers=workers)
+        engine.start()
+        try:
+            start = time.perf_counter()
+            engine.extract(pages)
+            elapsed = time.perf_counter() - start
+        finally:
+            engine.shutdown()
+        print(f"{workers:>7} {engine.omp_threads:>4} {elapsed:>9.3f} {len(pages) / elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(2)
+    main()
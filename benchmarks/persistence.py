@@ -0,0 +1,64 @@
+"""
+Rows per second persisting statements with many transactions on SQLite, per-statement
+ORM create against the single-transaction bulk insert.
+
+Usage: python -m benchmarks.persistence [--transactions 1000 10000] [--pages 3]
+"""
+import os
+import time
+import argparse
+import tempfile
+
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from webserver.database import Base
+from webserver.statement.serializers import StatementCreate
+
+
+def synthetic_statement(transactions: int) -> StatementCreate:
+    statement_date = datetime(2024, 1, 31)
+    return StatementCreate(
+        address="1 JALAN AMPANG\n50450 KUALA LUMPUR",
+        name="PUBLIC",
+        statement_date=statement_date,
+        detail={"total_debit": 0, "total_credit": 0, "no_debit": 0, "no_credit": 0},
+        transactions=[
+            {"transaction_date": statement_date - timedelta(days=i % 28), "amount": (i % 500) * 1.25 - 300}
+            for i in range(transactions)
+        ],
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transactions", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--pages", type=int, default=3, help="statements persisted per upload")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        print(f"{'transactions':>12} {'method':<8} {'seconds':>9} {'rows/s':>10}")
+        for count in args.transactions:
+            statements = [synthetic_statement(count) for _ in range(args.pages)]
+            rows = args.pages * (count + 2)
+
+            for method in ("create", "bulk"):
+                db = Session()
+                start = time.perf_counter()
+                if method == "create":
+                    for statement_data in statements:
+                        StatementCreate.create(statement_data, db)
+                else:
+                    StatementCreate.bulk_create(statements, db)
+                elapsed = time.perf_counter() - start
+                db.close()
+                print(f"{count:>12} {method:<8} {elapsed:>9.3f} {rows / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Rasterization time and pixel buffer size per raster profile.
+
+Usage: python -m benchmarks.raster_profiles test_pdf.pdf
+"""
+import sys
+import time
+
+from webserver.utils import PdfBytesToImageConverter, RasterProfile
+
+
+PROFILES = {
+    "200dpi RGB, all pages": RasterProfile(),
+    "200dpi RGB, page 1": RasterProfile(first_page=1, last_page=1),
+    "200dpi gray, page 1": RasterProfile(mode="L", first_page=1, last_page=1),
+    "200dpi mono, page 1": RasterProfile(mode="1", first_page=1, last_page=1),
+    "150dpi gray, page 1": RasterProfile(dpi=150, mode="L", first_page=1, last_page=1),
+    "300dpi gray, page 1": RasterProfile(dpi=300, mode="L", first_page=1, last_page=1),
+    "200dpi RGB, all pages, 4 threads": RasterProfile(thread_count=4),
+}
+
+
+def main(path: str) -> None:
+    with open(path, "rb") as pdf:
+        content = pdf.read()
+
+    print(f"{'profile':<34} {'pages':>5} {'MB':>8} {'seconds':>9}")
+    for name, profile in PROFILES.items():
+        start = time.perf_counter()
+        images = PdfBytesToImageConverter(content, profile).to_images()
+        elapsed = time.perf_counter() - start
+        # size of the decoded pixel buffers held in memory
+        size = sum(len(image.tobytes()) for image in images) / 1024 / 1024
+        print(f"{name:<34} {len(images):>5} {size:>8.1f} {elapsed:>9.3f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(2)
+    main(sys.argv[1])
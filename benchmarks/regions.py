@@ -0,0 +1,31 @@
+"""
+OCR time and pixels read per page, full-page pass against the bank layout template regions.
+
+Usage: python -m benchmarks.regions converted_test_pdf_1.PNG [more pages ...]
+"""
+import sys
+import time
+
+from webserver.utils import PublicBankSetting, StatementExtractor, Utils
+
+
+def main(paths: list) -> None:
+    layout = PublicBankSetting.LAYOUT
+    region_pixels = sum((right - left) * (bottom - top) for left, top, right, bottom in (r.box for r in layout))
+
+    print(f"{'page':<40} {'mode':<10} {'pixels':>10} {'seconds':>9}")
+    for path in paths:
+        image = Utils.open_image(path, raise_exception=True)
+        image.load()
+        for mode, regions_only, pixels in (("full", False, image.width * image.height), ("regions", True, region_pixels)):
+            start = time.perf_counter()
+            result = StatementExtractor(image, regions_only=regions_only).extract()
+            elapsed = time.perf_counter() - start
+            print(f"{path:<40} {mode:<10} {pixels:>10} {elapsed:>9.3f}  {len(result.transactions)} transactions")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(2)
+    main(sys.argv[1:])
@@ -0,0 +1,158 @@
+"""
+Time of each extraction stage on its own against a synthetic statement with known ground truth:
+rasterize, OCR, bank detection, parsing and the DB insert on SQLite, plus the extraction accuracy
+of the parser on the exact word tables and on the OCR output.
+
+Results are compared against the saved baseline and the run fails when a stage got slower than
+the tolerance allows or the accuracy dropped. Rasterize and OCR are skipped when poppler or
+Tesseract are not installed.
+
+Usage: python -m benchmarks.stages [--transactions 120] [--repeat 3] [--save] [--tolerance 0.25]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+
+from typing import Callable, List, Optional
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.synthetic import SyntheticStatement, accuracy
+from webserver.database import Base
+from webserver.statement.serializers import StatementCreate
+from webserver.utils import OcrPage, PdfToImageConverter, RasterProfile, StatementExtractor, StatementState
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "stages.json")
+# timings below this many seconds are too noisy for a relative tolerance
+MIN_SLACK = 0.001
+
+
+def timed(function: Callable, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def parse(pages: List[OcrPage]) -> StatementCreate:
+    state, transactions = StatementState(), []
+    for page in pages:
+        transactions += StatementExtractor(page).parse(page, state)
+    return state.to_statement(transactions)
+
+
+def run(transactions: int, repeat: int) -> dict:
+    statement = SyntheticStatement(transactions)
+    truth = statement.truth
+    pages = statement.ocr_pages()
+    stages, accuracies = {}, {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        if shutil.which("pdftoppm"):
+            path = os.path.join(directory, "statement.pdf")
+            statement.save_pdf(path)
+            stages["rasterize"] = timed(PdfToImageConverter(path, profile=RasterProfile()).to_images, repeat)
+
+        if shutil.which("tesseract"):
+            images = statement.images()
+            ocr_pages: List[OcrPage] = []
+
+            def __ocr() -> None:
+                ocr_pages[:] = [OcrPage.from_image(image) for image in images]
+            stages["ocr"] = timed(__ocr, repeat)
+            try:
+                accuracies["ocr"] = accuracy(parse(ocr_pages), truth)
+            except (ValueError, LookupError) as e:
+                accuracies["ocr"] = {"header": 0.0, "totals": 0.0, "transactions": 0.0, "error": str(e)}
+
+        stages["detect"] = timed(lambda: StatementExtractor(pages[0]).detect_bank(pages[0].text), repeat)
+        stages["parse"] = timed(lambda: parse(pages), repeat)
+        accuracies["parse"] = accuracy(parse(pages), truth)
+
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        def __persist() -> None:
+            db = Session()
+            StatementCreate.bulk_create([truth], db)
+            db.close()
+        stages["persist"] = timed(__persist, repeat)
+        engine.dispose()
+
+    return {
+        "transactions": transactions,
+        "pages": len(pages),
+        "stages": stages,
+        "accuracy": accuracies,
+    }
+
+
+def regressions(result: dict, baseline: dict, tolerance: float) -> List[str]:
+    found = []
+    if result["transactions"] != baseline["transactions"]:
+        return [f"baseline was taken with {baseline['transactions']} transactions, not comparable"]
+
+    for stage, seconds in result["stages"].items():
+        previous: Optional[float] = baseline["stages"].get(stage)
+        if previous is not None and seconds > previous * (1 + tolerance) + MIN_SLACK:
+            found.append(f"{stage}: {seconds:.4f}s against {previous:.4f}s")
+
+    for source, scores in result["accuracy"].items():
+        for metric in ("header", "totals", "transactions"):
+            previous = baseline["accuracy"].get(source, {}).get(metric)
+            if previous is not None and scores[metric] < previous:
+                found.append(f"{source} {metric} accuracy: {scores[metric]:.3f} against {previous:.3f}")
+    return found
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transactions", type=int, default=120)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save", action="store_true", help="save this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown per stage")
+    args = parser.parse_args()
+
+    result = run(args.transactions, args.repeat)
+
+    print(f"{result['transactions']} transactions on {result['pages']} pages")
+    print(f"{'stage':<10} {'seconds':>9} {'s/page':>9}")
+    for stage, seconds in result["stages"].items():
+        print(f"{stage:<10} {seconds:>9.4f} {seconds / result['pages']:>9.4f}")
+    for stage in ("rasterize", "ocr"):
+        if stage not in result["stages"]:
+            print(f"{stage:<10} {'skipped':>9} ({'pdftoppm' if stage == 'rasterize' else 'tesseract'} not installed)")
+
+    print(f"{'accuracy':<10} {'header':>9} {'totals':>9} {'rows':>9}")
+    for source, scores in result["accuracy"].items():
+        print(f"{source:<10} {scores['header']:>9.3f} {scores['totals']:>9.3f} {scores['transactions']:>9.3f}")
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as file:
+            json.dump(result, file, indent=2)
+        print(f"baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("no baseline to compare against, run with --save first")
+        return 0
+
+    with open(args.baseline) as file:
+        found = regressions(result, json.load(file), args.tolerance)
+    for regression in found:
+        print(f"REGRESSION {regression}")
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
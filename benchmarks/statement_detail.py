@@ -0,0 +1,61 @@
+"""
+Latency of GET /statements/{id} serialization on SQLite at 10, 1,000 and 10,000 transactions:
+lazy-loaded ORM + Pydantic against the single-query row tuple + orjson fast path.
+
+Usage: python -m benchmarks.statement_detail [--transactions 10 1000 10000] [--repeat 20]
+"""
+import os
+import time
+import argparse
+import tempfile
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.persistence import synthetic_statement
+from webserver.database import Base
+from webserver.statement.models import Statement
+from webserver.statement.serializers import StatementCreate, StatementResponse
+
+
+def orm_path(statement_id: int, db) -> bytes:
+    statement = db.query(Statement).filter(Statement.id == statement_id).first()
+    return StatementResponse.serialize(statement).model_dump_json().encode()
+
+
+def fast_path(statement_id: int, db) -> bytes:
+    return StatementResponse.fetch_json(statement_id, db)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transactions", type=int, nargs="+", default=[10, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        print(f"{'transactions':>12} {'orm ms':>9} {'fast ms':>9}")
+        for count in args.transactions:
+            db = Session()
+            statement_id, = StatementCreate.bulk_create([synthetic_statement(count)], db)
+            db.close()
+
+            timings = {}
+            for name, path in (("orm", orm_path), ("fast", fast_path)):
+                samples = []
+                for _ in range(args.repeat):
+                    db = Session()
+                    start = time.perf_counter()
+                    path(statement_id, db)
+                    samples.append(time.perf_counter() - start)
+                    db.close()
+                timings[name] = sorted(samples)[len(samples) // 2] * 1000
+            print(f"{count:>12} {timings['orm']:>9.2f} {timings['fast']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
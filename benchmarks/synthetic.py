@@ -0,0 +1,247 @@
+"""
+Synthetic Public Bank style statements with known ground truth.
+
+The pages are drawn in the base DPI coordinates of PublicBankSetting (first page rows in the
+debit/credit windows, totals in the summary band, continuation pages with whole-height columns),
+then scaled to the requested DPI. Every drawn word is recorded with its box, so a statement can be
+fed to the parser as exact word tables without running Tesseract, or rendered to images/PDF to
+time rasterization and OCR.
+
+Usage: python -m benchmarks.synthetic out.pdf [--transactions 120] [--dpi 200] [--seed 1]
+"""
+import random
+import argparse
+
+import numpy as np
+
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from PIL import Image, ImageDraw, ImageFont
+
+from webserver.utils import OcrPage, RasterProfile, PublicBankSetting
+from webserver.words import WordTable
+from webserver.statement.serializers import StatementCreate
+
+PAGE_SIZE = (1654, 2339) # A4 at the base DPI
+FONT_SIZE = 24
+ROW_HEIGHT = 34
+FIRST_PAGE_ROWS = range(960, 1190, ROW_HEIGHT)
+NEXT_PAGE_ROWS = range(200, 2200, ROW_HEIGHT)
+
+DATE_X = 100
+DESCRIPTION_X = 250
+BALANCE_X = 1300
+AMOUNT_X = {
+    "debit": PublicBankSetting.COLUMNS["debit"][0] + 30,
+    "credit": PublicBankSetting.COLUMNS["credit"][0] + 30,
+}
+DESCRIPTIONS = ["IBG TRANSFER", "DUITNOW QR", "CASH DEPOSIT", "CHEQUE", "FPX PAYMENT", "ATM WITHDRAWAL", "SERVICE CHARGE"]
+
+
+def amount_text(amount: float) -> str:
+    return f"{abs(amount):,.2f}"
+
+
+class SyntheticPage:
+    """
+    One drawn page: lines of (block, words) where each word is (left, top, text) in base coordinates.
+    """
+    def __init__(self, number: int) -> None:
+        self.number = number
+        self.lines: List[Tuple[int, List[Tuple[int, int, str]]]] = []
+
+    def line(self, block: int, top: int, *words: Tuple[int, str]) -> None:
+        self.lines.append((block, [(left, top, text) for left, text in words]))
+
+    def word_table(self, font: ImageFont.FreeTypeFont) -> WordTable:
+        rows, line_nums = [], Counter()
+        for block, words in self.lines:
+            line_nums[block] += 1
+            for word_num, (left, top, text) in enumerate(words, start=1):
+                tokens = text.split(" ")
+                for index, token in enumerate(tokens):
+                    # the tokens of a phrase follow each other separated by a single space
+                    offset = font.getlength(" ".join(tokens[:index] + [""])) if index else 0
+                    box_left, box_top, box_right, box_bottom = font.getbbox(token)
+                    rows.append({
+                        "level": 5, "page_num": 1, "block_num": block, "par_num": 1,
+                        "line_num": line_nums[block], "word_num": word_num * 10 + index,
+                        "left": int(left + offset + box_left), "top": top + box_top,
+                        "width": box_right - box_left, "height": box_bottom - box_top,
+                        "conf": 96.0, "text": token,
+                    })
+        return WordTable.from_rows(rows)
+
+    def render(self, font: ImageFont.FreeTypeFont, dpi: int) -> Image.Image:
+        scale = dpi / RasterProfile.BASE_DPI
+        size = tuple(round(side * scale) for side in PAGE_SIZE)
+        image = Image.new("L", size, 255)
+        draw = ImageDraw.Draw(image)
+        scaled_font = font if scale == 1 else ImageFont.load_default(size=round(FONT_SIZE * scale))
+        for _, words in self.lines:
+            for left, top, text in words:
+                draw.text((left * scale, top * scale), text, fill=0, font=scaled_font)
+        image.info["dpi"] = (dpi, dpi)
+        return image
+
+
+class SyntheticStatement:
+    """
+    A statement with `transactions` random rows spread over as many pages as needed, and its
+    ground truth as the StatementCreate the extractor should produce.
+    """
+    def __init__(self, transactions: int=40, seed: int=1, statement_date: datetime=datetime(2024, 1, 31)) -> None:
+        self.random = random.Random(seed)
+        self.font = ImageFont.load_default(size=FONT_SIZE)
+        self.address = ["1 JALAN AMPANG", "50450 KUALA LUMPUR"]
+        self.statement_date = statement_date
+
+        rows = []
+        balance = self.random.uniform(1000, 5000)
+        date = statement_date.replace(day=1)
+        for _ in range(transactions):
+            if self.random.random() < 0.6 and date < statement_date:
+                date = min(date + timedelta(days=self.random.randint(1, 3)), statement_date)
+            kind = "debit" if self.random.random() < 0.6 else "credit"
+            amount = round(self.random.uniform(1, 2500), 2)
+            balance += amount if kind == "credit" else -amount
+            rows.append((date, kind, amount, balance))
+        self.rows = rows
+        self.pages = self.__layout()
+
+    def __layout(self) -> List[SyntheticPage]:
+        debits = [amount for _, kind, amount, _ in self.rows if kind == "debit"]
+        credits = [amount for _, kind, amount, _ in self.rows if kind == "credit"]
+
+        first = SyntheticPage(1)
+        first.line(1, 60, (100, "PUBLIC BANK BERHAD"))
+        first.line(1, 100, (100, "Statement Date"), (300, self.statement_date.strftime("%d %b %Y")))
+        for index, line in enumerate(self.address):
+            first.line(2, 320 + index * 40, (220, line))
+        first.line(3, 900, (DATE_X, "Date"), (DESCRIPTION_X, "Transaction"), (AMOUNT_X["debit"], "Debit"),
+                   (AMOUNT_X["credit"], "Credit"), (BALANCE_X, "Balance"))
+        first.line(5, 1450, (100, "Total Debits"), (500, amount_text(sum(debits))))
+        first.line(5, 1490, (100, "Total Credits"), (500, amount_text(sum(credits))))
+        first.line(5, 1530, (100, "No. of Debits"), (500, str(len(debits))))
+        first.line(5, 1570, (100, "No. of Credits"), (500, str(len(credits))))
+
+        pages, page, slots = [first], first, iter(FIRST_PAGE_ROWS)
+        previous_date: Optional[datetime] = None
+        for date, kind, amount, balance in self.rows:
+            top = next(slots, None)
+            if top is None:
+                page = SyntheticPage(len(pages) + 1)
+                page.line(1, 60, (100, "Page"), (200, str(page.number)))
+                pages.append(page)
+                slots = iter(NEXT_PAGE_ROWS)
+                top = next(slots)
+
+            # like the real statements, the date is only printed when it changes
+            words = [] if date == previous_date else [(DATE_X, date.strftime("%d/%m"))]
+            words += [
+                (DESCRIPTION_X, self.random.choice(DESCRIPTIONS)),
+                (AMOUNT_X[kind], amount_text(amount)),
+                (BALANCE_X, amount_text(balance)),
+            ]
+            page.line(4, top, *words)
+            previous_date = date
+        return pages
+
+    @property
+    def truth(self) -> StatementCreate:
+        debits = [amount for _, kind, amount, _ in self.rows if kind == "debit"]
+        credits = [amount for _, kind, amount, _ in self.rows if kind == "credit"]
+        return StatementCreate(
+            address="\n".join(self.address) + "\n",
+            name="PUBLIC",
+            statement_date=self.statement_date,
+            detail={
+                "total_debit": round(sum(debits), 2),
+                "total_credit": round(sum(credits), 2),
+                "no_debit": len(debits),
+                "no_credit": len(credits),
+            },
+            transactions=[
+                {"transaction_date": date, "amount": -amount if kind == "debit" else amount}
+                for date, kind, amount, _ in self.rows
+            ],
+        )
+
+    def ocr_pages(self) -> List[OcrPage]:
+        """
+        The exact word tables of the pages, as a perfect OCR pass would return them.
+        """
+        return [OcrPage(page.word_table(self.font)) for page in self.pages]
+
+    def images(self, dpi: int=RasterProfile.BASE_DPI) -> List[Image.Image]:
+        return [page.render(self.font, dpi) for page in self.pages]
+
+    def scanned_images(self, dpi: int=RasterProfile.BASE_DPI, skew: float=1.5, noise: float=12.0,
+                       border: int=40) -> List[Image.Image]:
+        """
+        The pages as a flatbed scan would return them: in colour, rotated by skew degrees, with
+        uneven background shading, sensor noise and a dark border around the paper.
+        """
+        rng = np.random.default_rng(self.random.randint(0, 2 ** 32))
+        scanned = []
+        for image in self.images(dpi):
+            rotated = image.rotate(-skew, resample=Image.Resampling.BILINEAR, fillcolor=255)
+            pixels = np.asarray(rotated, dtype=np.float64)
+            height, width = pixels.shape
+            shading = np.linspace(0, 60, width)[None, :] + np.linspace(0, 30, height)[:, None]
+            pixels = pixels - shading * (pixels / 255) + rng.normal(0, noise, pixels.shape)
+            pixels[:border, :] = pixels[-border:, :] = pixels[:, :border] = pixels[:, -border:] = 20
+
+            gray = np.clip(pixels, 0, 255).astype(np.uint8)
+            page = Image.fromarray(np.dstack([gray, gray, np.clip(gray.astype(int) - 8, 0, 255).astype(np.uint8)]), "RGB")
+            page.info["dpi"] = (dpi, dpi)
+            scanned.append(page)
+        return scanned
+
+    def save_pdf(self, path: str, dpi: int=RasterProfile.BASE_DPI) -> None:
+        # image-only PDF, so the extraction goes through rasterization and OCR like a scanned statement
+        images = self.images(dpi)
+        images[0].save(path, save_all=True, append_images=images[1:], resolution=dpi)
+
+
+def accuracy(result: StatementCreate, truth: StatementCreate) -> dict:
+    """
+    Share of the ground truth the extraction got right: the header fields, the totals and the
+    transactions, matched as a multiset of (date, amount).
+    """
+    def __key(transaction) -> tuple:
+        return transaction.transaction_date, round(transaction.amount, 2)
+
+    expected = Counter(__key(transaction) for transaction in truth.transactions)
+    found = Counter(__key(transaction) for transaction in result.transactions)
+    matched = sum((expected & found).values())
+
+    return {
+        "header": float(
+            result.name.upper() == truth.name
+            and result.statement_date == truth.statement_date
+            and result.address.strip() == truth.address.strip()
+        ),
+        "totals": float(result.detail == truth.detail),
+        "transactions": matched / max(sum(expected.values()), 1),
+        "extra_transactions": sum((found - expected).values()),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path")
+    parser.add_argument("--transactions", type=int, default=120)
+    parser.add_argument("--dpi", type=int, default=RasterProfile.BASE_DPI)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    statement = SyntheticStatement(args.transactions, seed=args.seed)
+    statement.save_pdf(args.path, args.dpi)
+    truth = statement.truth
+    print(f"{args.path}: {len(statement.pages)} pages, {len(truth.transactions)} transactions, {truth.detail}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Time per page of the PDF text-layer fast path against rasterization + OCR. Fails when the text
+layer of a page doesn't extract the same statement as its OCR: the statement date and totals
+must match and at least --min-accuracy of the OCR'd transactions must be found, word boxes and
+confidences are free to differ.
+
+Usage: python -m benchmarks.text_layer test_pdf.pdf [--min-accuracy 0.95]
+"""
+import time
+import argparse
+
+from benchmarks.synthetic import accuracy
+from webserver.utils import PdfBytesToImageConverter, PdfTextLayer, StatementExtractor
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path")
+    parser.add_argument("--min-accuracy", type=float, default=0.95, help="share of the OCR'd transactions the text layer must find")
+    args = parser.parse_args()
+
+    with open(args.path, "rb") as pdf:
+        content = pdf.read()
+
+    pages, layer_seconds = timed(PdfTextLayer(content).pages)
+    images, raster_seconds = timed(PdfBytesToImageConverter(content).to_images)
+    print(f"text layer: {layer_seconds:.3f}s, rasterization: {raster_seconds:.3f}s for {len(images)} pages")
+
+    print(f"{'page':>4} {'text layer':>11} {'ocr':>9} {'transactions':>13}")
+    for i, image in enumerate(images):
+        ocr, ocr_seconds = timed(lambda: StatementExtractor(image).extract())
+        if pages[i] is None:
+            print(f"{i + 1:>4} {'-':>11} {ocr_seconds:>9.3f}  no usable text layer")
+            continue
+
+        layer, parse_seconds = timed(lambda: StatementExtractor(pages[i]).extract())
+        # the OCR result is the reference, the parsed fields are compared rather than the words
+        scores = accuracy(layer, ocr)
+        print(f"{i + 1:>4} {parse_seconds:>11.3f} {ocr_seconds:>9.3f} {scores['transactions']:>13.1%}")
+        assert layer.statement_date == ocr.statement_date, f"page {i + 1}: the statement dates differ"
+        assert scores["totals"] == 1.0, f"page {i + 1}: the totals differ"
+        assert scores["transactions"] >= args.min_accuracy, (
+            f"page {i + 1}: the text layer found {scores['transactions']:.1%} of the OCR'd transactions"
+        )
+
+
+if __name__ == "__main__":
+    main()
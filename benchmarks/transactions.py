@@ -0,0 +1,86 @@
+"""
+Micro-benchmark of PublicBankSetting.get_transaction on a large synthetic word table,
+against the previous iterrows() implementation. Both outputs must be identical.
+
+Usage: python -m benchmarks.transactions [--rows 20000] [--repeat 3]
+"""
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from datetime import datetime
+from webserver.utils import PublicBankSetting, Utils
+from webserver.words import WordTable
+
+
+def synthetic_words(rows: int, seed: int=0) -> pd.DataFrame:
+    """
+    Lines of "DD/MM description amount", the amount sitting in the debit or credit column.
+    Some lines carry no date and inherit the date of the closest line above.
+    """
+    rng = np.random.default_rng(seed)
+    words = []
+    for line in range(1, rows + 1):
+        top = 960 + (line % 200)
+        if line % 4:
+            words.append({"line_num": line, "left": 100, "top": top, "text": f"{rng.integers(1, 29):02d}/{rng.integers(1, 13):02d}"})
+        words.append({"line_num": line, "left": 300, "top": top, "text": "TRANSFER"})
+        left = 900 if rng.random() < 0.5 else 1100
+        words.append({"line_num": line, "left": left, "top": top, "text": f"{rng.integers(1, 100000):,}.{rng.integers(0, 100):02d}"})
+    return pd.DataFrame(words)
+
+
+def legacy_get_transaction(text: str, df: pd.DataFrame, statement_date: datetime) -> list:
+    debits = df[(df["left"] > 850) & (df["left"] < 1050) & (df["top"] > 950) & (df["top"] < 1200)]
+    credits = df[(df["left"] > 1050) & (df["left"] < 1250) & (df["top"] > 950) & (df["top"] < 1400)]
+
+    date_df = df[df['text'].str.contains(r'^\d{2}/\d{2}$', regex=True, na=False)]
+    dates = { row['line_num']: row for _, row in date_df.iterrows() }
+    line_nums = sorted(dates)
+
+    transactions = []
+    for tx_df, negative in ((debits, True), (credits, False)):
+        for _, tx in tx_df.iterrows():
+            line = tx["line_num"]
+            if dates.get(line) is None:
+                line = Utils.largest_smaller(line_nums, line)
+                if line is None:
+                    continue
+            date = datetime.strptime(f"{dates.get(line)['text']}/{statement_date.year}", "%d/%m/%Y")
+            amount = float(tx["text"].replace(',', ''))
+            transactions.append({"transaction_date": date, "amount": -amount if negative else amount})
+    return transactions
+
+
+def best_of(fn, repeat: int) -> tuple:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return result, min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = synthetic_words(args.rows)
+    words = WordTable.from_rows(df.to_dict("records"))
+    statement_date = datetime(2024, 1, 31)
+
+    legacy, legacy_seconds = best_of(lambda: legacy_get_transaction("", df, statement_date), args.repeat)
+    # a fresh copy every run, so building the spatial index is timed too
+    vectorized, vectorized_seconds = best_of(lambda: PublicBankSetting.get_transaction("", words.replace(), statement_date), args.repeat)
+
+    assert legacy == vectorized, "vectorized output differs from the legacy implementation"
+    print(f"{len(df)} words, {len(vectorized)} transactions")
+    print(f"iterrows:   {legacy_seconds:.4f}s")
+    print(f"vectorized: {vectorized_seconds:.4f}s ({legacy_seconds / vectorized_seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Extraction accuracy and OCR cost of the cell verification on noisy, low resolution synthetic scans:
+the full-page pass alone, the full-page pass followed by the verification of the uncertain amount,
+date and total tokens, and the whole-page retry at a higher resolution it stands in for. Each run
+reports the Tesseract calls, the OCR'd pixels and whether the transactions add up to the totals.
+
+Usage: python -m benchmarks.verify [--transactions 60] [--dpi 100] [--retry-dpi 300] [--noise 30] [--min-conf 80]
+"""
+import time
+import shutil
+import argparse
+
+from benchmarks.synthetic import SyntheticStatement, accuracy
+from webserver.metrics import metrics
+from webserver.utils import CellVerifier, StatementExtractor, StatementState
+
+
+def totals() -> tuple:
+    calls = sum(metrics.metrics["tesseract"].series.values())
+    pixels = sum(total for _, total, _ in metrics.metrics["pixels"].series.values())
+    return calls, pixels
+
+
+def extract(images: list, verifier) -> tuple:
+    before = totals()
+    start = time.perf_counter()
+    state, transactions = StatementState(), []
+    for i, image in enumerate(images):
+        extractor = StatementExtractor(image, verifier=verifier)
+        page = extractor.read(first_page=i == 0, bank_name="PUBLIC")
+        transactions += extractor.parse(page, state)
+    elapsed = time.perf_counter() - start
+    after = totals()
+    return state.to_statement(transactions), state.check(), elapsed, after[0] - before[0], after[1] - before[1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transactions", type=int, default=60)
+    parser.add_argument("--dpi", type=int, default=100)
+    parser.add_argument("--retry-dpi", type=int, default=300)
+    parser.add_argument("--noise", type=float, default=30.0)
+    parser.add_argument("--min-conf", type=float, default=80)
+    args = parser.parse_args()
+
+    if not shutil.which("tesseract"):
+        print("skipped (tesseract not installed)")
+        return
+
+    statement = SyntheticStatement(args.transactions)
+    truth = statement.truth
+    runs = (
+        ("full page", statement.scanned_images(args.dpi, skew=0, noise=args.noise), None),
+        ("verified", statement.scanned_images(args.dpi, skew=0, noise=args.noise), CellVerifier(min_conf=args.min_conf)),
+        ("page retry", statement.scanned_images(args.retry_dpi, skew=0, noise=args.noise), None),
+    )
+
+    print(f"{'run':<11} {'seconds':>8} {'calls':>6} {'Mpixels':>8} {'totals':>7} {'rows':>6} {'adds up':>8}")
+    for name, images, verifier in runs:
+        try:
+            result, issues, elapsed, calls, pixels = extract(images, verifier)
+            scores = accuracy(result, truth)
+            print(f"{name:<11} {elapsed:>8.3f} {calls:>6} {pixels / 1e6:>8.2f} {scores['totals']:>7.3f} "
+                  f"{scores['transactions']:>6.3f} {str(not issues):>8}")
+        except (ValueError, LookupError) as e:
+            print(f"{name:<11} failed: {e}")
+
+
+if __name__ == "__main__":
+    main()
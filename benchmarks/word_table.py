@@ -0,0 +1,82 @@
+"""
+Memory and query time of the word table of a page, pandas DataFrame against WordTable, on the
+pages of a synthetic statement: the words inside a rectangle (the address crop and an amount
+column) and the words of a line. The WordTable queries include building their index, as a page
+is only queried a few times.
+
+Usage: python -m benchmarks.word_table [--transactions 200] [--repeat 200]
+"""
+import time
+import argparse
+import statistics
+
+import pandas as pd
+
+from benchmarks.synthetic import SyntheticStatement
+from webserver.utils import PublicBankSetting
+
+ADDRESS = (200, 300, 580, 450)
+
+
+def timed(function, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def frame_within(df: pd.DataFrame, area: tuple) -> pd.DataFrame:
+    left, top, right, bottom = area
+    centre_x = df["left"] + df["width"] / 2
+    centre_y = df["top"] + df["height"] / 2
+    return df[(centre_x >= left) & (centre_x <= right) & (centre_y >= top) & (centre_y <= bottom)]
+
+
+def frame_column(df: pd.DataFrame, area: tuple) -> pd.DataFrame:
+    left, top, right, bottom = area
+    return df[(df["left"] > left) & (df["left"] < right) & (df["top"] > top) & (df["top"] < bottom)]
+
+
+def frame_line(df: pd.DataFrame, line_id: tuple) -> pd.DataFrame:
+    page_num, block_num, par_num, line_num = line_id
+    return df[(df["page_num"] == page_num) & (df["block_num"] == block_num)
+              & (df["par_num"] == par_num) & (df["line_num"] == line_num)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transactions", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    left, right = PublicBankSetting.COLUMNS["debit"]
+    top, bottom = PublicBankSetting.FIRST_PAGE_ROWS["debit"]
+    column = (left, top, right, bottom)
+
+    print(f"{'page':>4} {'words':>6} {'frame KB':>9} {'table KB':>9} {'query':<8} {'frame ms':>9} {'table ms':>9}")
+    for number, page in enumerate(SyntheticStatement(args.transactions).ocr_pages(), start=1):
+        words = page.words
+        split = words.to_split()
+        df = pd.DataFrame(split["data"], columns=split["columns"])
+        line_id = words.line_ids()[len(words.line_ids()) // 2]
+
+        queries = {
+            "address": (lambda: frame_within(df, ADDRESS),
+                        lambda: words.replace().within(ADDRESS)),
+            "column": (lambda: frame_column(df, column),
+                       lambda: words.replace().within((left + 1, top + 1, right - 1, bottom - 1), anchor="corner")),
+            "line": (lambda: frame_line(df, line_id),
+                     lambda: words.replace().on_line(line_id)),
+        }
+        memory = f"{df.memory_usage(deep=True).sum() / 1024:>9.1f} {words.nbytes / 1024:>9.1f}"
+        for name, (frame_query, table_query) in queries.items():
+            assert frame_query()["text"].tolist() == table_query().text.tolist(), f"{name} results differ"
+            frame_ms = timed(frame_query, args.repeat) * 1000
+            table_ms = timed(table_query, args.repeat) * 1000
+            print(f"{number:>4} {len(words):>6} {memory} {name:<8} {frame_ms:>9.3f} {table_ms:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,26 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
+from webserver.engine import extraction_engine
+from webserver.ingest import UploadSizeLimitMiddleware
+from webserver.jobs import job_queue
+from webserver.metrics import ServerTimingMiddleware, profiler, PROFILER_ENABLED
 from webserver.urls import router as router
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    extraction_engine.start()
+    job_queue.start()
+    if PROFILER_ENABLED:
+        profiler.start()
+    yield
+    profiler.stop()
+    await job_queue.stop()
+    extraction_engine.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(UploadSizeLimitMiddleware)
+app.add_middleware(ServerTimingMiddleware)
 app.include_router(router)
@@ -1,28 +1,70 @@
-from fastapi import APIRouter, HTTPException, Depends, File, UploadFile
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Depends, File, UploadFile, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
-import os
+from datetime import datetime
+from typing import List, Optional
 
-from ..database import get_db
+from ..batch import BatchUpload
+from ..cache import content_cache
+from ..database import get_db, get_async_db
+from ..ingest import ingest, UploadRejectedError
+from ..jobs import job_queue, QueueFullError, RASTER_PROFILE
+from ..metrics import metrics
 from ..statement.models import Statement
 from ..statement.serializers import *
-from ..utils import PdfToImageConverter, StatementExtractor
+from ..utils import bank_registry
 
 router = APIRouter()
 
 
 @router.get("/", response_model=List[StatementListResponse])
-async def list_statement(db: Session=Depends(get_db)):
-    statements = db.query(Statement).all()
-    return statements
+async def list_statement(response: Response, limit: int=Query(50, ge=1, le=500), cursor: Optional[str]=None,
+                         date_from: Optional[datetime]=None, date_to: Optional[datetime]=None,
+                         name: Optional[str]=None, db: AsyncSession=Depends(get_async_db)):
+    """
+    Statements ordered by (statement_date, id). When more are available, the X-Next-Cursor
+    response header holds the cursor of the next page.
+    """
+    query = select(Statement.id, Statement.statement_date, Statement.created_at)
+
+    if name:
+        query = query.where(Statement.name == name)
+    if date_from:
+        query = query.where(Statement.statement_date >= date_from)
+    if date_to:
+        query = query.where(Statement.statement_date <= date_to)
+    if cursor:
+        try:
+            last_date, last_id = StatementListResponse.decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.where(tuple_(Statement.statement_date, Statement.id) > tuple_(last_date, last_id))
+
+    query = query.order_by(Statement.statement_date, Statement.id).limit(limit + 1)
+    rows = (await db.execute(query)).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = StatementListResponse.encode_cursor(rows[-1].statement_date, rows[-1].id)
+
+    return [row._asdict() for row in rows]
+
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    return content_cache.stats()
 
 
 @router.get("/{statement_id}", response_model=StatementResponse)
-async def get_one_statement(statement_id: int, db: Session=Depends(get_db)):
-    statement = db.query(Statement).filter(Statement.id == statement_id).first()
-    if not statement:
+async def get_one_statement(statement_id: int, db: AsyncSession=Depends(get_async_db)):
+    rows = (await db.execute(StatementResponse.detail_query(statement_id))).all()
+    content = StatementResponse.encode_rows(rows)
+    if content is None:
         raise HTTPException(status_code=404, detail="Statement not found")
-    return StatementResponse.serialize(statement)
+    return Response(content=content, media_type="application/json")
 
 
 # API to test create statement, not in the assessment scope
@@ -32,21 +74,92 @@ async def create_statement(statement_data: StatementCreate, db: Session=Depends(
     return statement
 
 
-@router.post("/upload/")
-async def upload_statement(file: UploadFile = File(...), db: Session=Depends(get_db)):
-    content = await file.read()
+# the body is streamed by ingest instead of being parsed as a form, it is only described here
+UPLOAD_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"file": {"type": "string", "format": "binary"}},
+            "required": ["file"],
+        }}},
+    },
+}
+
+
+@router.post("/upload/", status_code=202, response_model=StatementJobResponse, openapi_extra=UPLOAD_BODY)
+async def upload_statement(request: Request, dpi: Optional[int]=None, mode: Optional[str]=None,
+                           first_page: Optional[int]=None, last_page: Optional[int]=None):
+    try:
+        profile = RASTER_PROFILE.with_overrides(dpi=dpi, mode=mode, first_page=first_page, last_page=last_page)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        with metrics.stage("ingest"):
+            upload = await ingest(request, timeout=profile.timeout)
+    except UploadRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    # the same PDF was already processed: answer from the cache, without detection nor queueing
+    statement_ids = await asyncio.to_thread(content_cache.get_upload, upload.digest, profile)
+    if statement_ids is not None:
+        return StatementJobResponse.serialize(job_queue.settled(upload, statement_ids, upload.filename, profile))
+
+    try:
+        with metrics.stage("detect_pdf"):
+            bank_name = await asyncio.to_thread(bank_registry.from_pdf, upload.path, profile.timeout)
+    except ValueError as e:
+        upload.close()
+        raise HTTPException(status_code=422, detail=str(e))
+
+    try:
+        job = job_queue.submit(upload, upload.filename, profile, bank_name)
+    except UploadRejectedError as e:
+        upload.close()
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except QueueFullError as e:
+        upload.close()
+        metrics.observe("rejected", 1, reason="queue_full")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+    return StatementJobResponse.serialize(job)
+
+
+@router.post("/upload/batch/")
+async def upload_statement_batch(files: List[UploadFile] = File(...), dpi: Optional[int]=None, mode: Optional[str]=None,
+                                 first_page: Optional[int]=None, last_page: Optional[int]=None):
+    """
+    PDFs and/or zip archives of PDFs, processed concurrently. The response streams one
+    StatementBatchResult per PDF as newline-delimited JSON, as soon as each one is settled.
+    """
+    try:
+        profile = RASTER_PROFILE.with_overrides(dpi=dpi, mode=mode, first_page=first_page, last_page=last_page)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    batch = BatchUpload(profile)
+    try:
+        for file in files:
+            await batch.add(file)
+    except UploadRejectedError as e:
+        batch.close()
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    return StreamingResponse(batch.results(), media_type="application/x-ndjson")
 
-    with open(file.filename, "wb") as new_file:
-        new_file.write(content)
 
-    converter = PdfToImageConverter(file.filename)
-    images = converter.convert()
+@router.get("/jobs/{job_id}", response_model=StatementJobResponse)
+async def get_upload_job(job_id: str):
+    job = job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StatementJobResponse.serialize(job)
 
-    for image in images:
-        extractor = StatementExtractor(image)
-        statement_data = extractor.extract()
-        statement = StatementCreate.create(statement_data, db)
-        os.remove(image)
-    os.remove(file.filename)
 
-    return statement
\ No newline at end of file
+@router.delete("/jobs/{job_id}", response_model=StatementJobResponse)
+async def cancel_upload_job(job_id: str):
+    job = job_queue.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StatementJobResponse.serialize(job)
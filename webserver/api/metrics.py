@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Query
+from fastapi.responses import PlainTextResponse
+
+from ..metrics import metrics, profiler
+
+router = APIRouter()
+
+
+@router.get("", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/profiler")
+async def get_profiler(top: int=Query(30, ge=1, le=500)):
+    return profiler.report(top)
+
+
+@router.put("/profiler")
+async def set_profiler(enabled: bool, reset: bool=False):
+    """
+    Turn the sampling profiler of this process on or off, optionally dropping the samples so far.
+    """
+    if reset:
+        profiler.reset()
+    if enabled:
+        profiler.start()
+    else:
+        profiler.stop()
+    return profiler.report(top=0)
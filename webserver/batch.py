@@ -0,0 +1,154 @@
+import asyncio
+import zipfile
+
+from decouple import config
+from fastapi import UploadFile
+from typing import AsyncIterator, List, Optional
+
+from .cache import content_cache
+from .ingest import IngestedUpload, UploadRejectedError, inspect, spool
+from .jobs import Job, JobStatus, QueueFullError, job_queue
+from .metrics import metrics
+from .statement.serializers import StatementBatchResult
+from .utils import RasterProfile, bank_registry
+
+
+BATCH_CONCURRENCY = config("BATCH_CONCURRENCY", default=4, cast=int)
+BATCH_MAX_FILES = config("BATCH_MAX_FILES", default=1000, cast=int)
+# seconds to wait before submitting again when the job queue is full
+BATCH_RETRY_DELAY = config("BATCH_RETRY_DELAY", default=1.0, cast=float)
+
+ZIP_MAGIC = b"PK\x03\x04"
+
+
+class ArchiveMember:
+    """
+    A PDF inside an uploaded zip archive, read like an UploadFile so it can be spooled the same way.
+    """
+    def __init__(self, archive: zipfile.ZipFile, info: zipfile.ZipInfo) -> None:
+        self.filename = info.filename
+        self.file = archive.open(info)
+
+    async def read(self, size: int=-1) -> bytes:
+        return await asyncio.to_thread(self.file.read, size)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class BatchItem:
+    def __init__(self, filename: Optional[str], upload: Optional[IngestedUpload]=None,
+                 error: Optional[str]=None) -> None:
+        self.filename = filename
+        self.upload = upload
+        self.error = error
+
+
+class BatchUpload:
+    """
+    Several PDFs uploaded at once, as separate files and/or zip archives of PDFs.
+
+    The files are spooled to their own temp files while the request is being handled, as the
+    multipart files are gone once the response starts streaming. They are then processed through
+    the job queue with at most `concurrency` of them in flight, and results() yields one NDJSON
+    line per file as soon as it is settled, in completion order. A rejected or failed file only
+    gets an error line, it never fails the batch.
+    """
+    def __init__(self, profile: RasterProfile, concurrency: int=BATCH_CONCURRENCY, max_files: int=BATCH_MAX_FILES) -> None:
+        if concurrency < 1:
+            raise ValueError("Batch concurrency must be positive")
+
+        self.profile = profile
+        self.concurrency = concurrency
+        self.max_files = max_files
+        self.items: List[BatchItem] = []
+
+    async def add(self, file: UploadFile) -> None:
+        head = await file.read(len(ZIP_MAGIC))
+        await file.seek(0)
+        if head == ZIP_MAGIC:
+            await self.__add_archive(file)
+        else:
+            await self.__add_file(file.filename, file)
+
+    async def __add_file(self, filename: Optional[str], file) -> None:
+        if len(self.items) >= self.max_files:
+            raise UploadRejectedError(f"Batch exceeds the maximum of {self.max_files} files", status_code=413)
+
+        try:
+            self.items.append(BatchItem(filename, upload=await spool(file)))
+        except UploadRejectedError as e:
+            self.items.append(BatchItem(filename, error=str(e)))
+
+    async def __add_archive(self, file: UploadFile) -> None:
+        try:
+            archive = zipfile.ZipFile(file.file)
+        except zipfile.BadZipFile:
+            self.items.append(BatchItem(file.filename, error="Unable to read the zip archive"))
+            return
+
+        with archive:
+            for info in archive.infolist():
+                if info.is_dir() or info.filename.startswith("__MACOSX/"):
+                    continue
+                # members are spooled through the same size limit, a zip bomb stops at max_size
+                member = ArchiveMember(archive, info)
+                try:
+                    await self.__add_file(f"{file.filename}/{info.filename}", member)
+                finally:
+                    member.close()
+
+    def close(self) -> None:
+        for item in self.items:
+            if item.upload is not None:
+                item.upload.close()
+
+    async def results(self) -> AsyncIterator[bytes]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = [asyncio.ensure_future(self.__process(item, semaphore)) for item in self.items]
+        try:
+            for task in asyncio.as_completed(tasks):
+                result = await task
+                yield result.model_dump_json().encode() + b"\n"
+        finally:
+            # the client went away: stop the files still waiting or running
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.close()
+
+    async def __process(self, item: BatchItem, semaphore: asyncio.Semaphore) -> StatementBatchResult:
+        if item.upload is None:
+            return StatementBatchResult(filename=item.filename, status=JobStatus.FAILED, error=item.error)
+
+        async with semaphore:
+            job: Optional[Job] = None
+            try:
+                with metrics.stage("ingest"):
+                    await asyncio.to_thread(inspect, item.upload, timeout=self.profile.timeout)
+
+                # the same PDF was already processed, no detection nor queueing
+                statement_ids = await asyncio.to_thread(content_cache.get_upload, item.upload.digest, self.profile)
+                if statement_ids is not None:
+                    job = job_queue.settled(item.upload, statement_ids, item.filename, self.profile)
+                else:
+                    with metrics.stage("detect_pdf"):
+                        bank_name = await asyncio.to_thread(bank_registry.from_pdf, item.upload.path, self.profile.timeout)
+
+                while job is None:
+                    try:
+                        job = job_queue.submit(item.upload, item.filename, self.profile, bank_name)
+                    except QueueFullError:
+                        # other uploads fill the queue, wait for room rather than failing the file
+                        await asyncio.sleep(BATCH_RETRY_DELAY)
+                # the job owns the upload from now on
+                item.upload = None
+                await job.wait()
+            except (UploadRejectedError, ValueError) as e:
+                return StatementBatchResult(filename=item.filename, status=JobStatus.FAILED, error=str(e))
+            except asyncio.CancelledError:
+                if job is not None:
+                    job_queue.cancel(job.id)
+                raise
+
+        return StatementBatchResult.serialize(item.filename, job)
@@ -0,0 +1,143 @@
+import json
+import hashlib
+import threading
+
+from collections import OrderedDict
+from decouple import config
+from PIL import Image
+from typing import Dict, List, Optional
+
+from .database import SessionLocal
+from .statement.models import Statement, StatementCache
+from .utils import OcrPage, RasterProfile
+
+
+CACHE_SIZE = config("CACHE_SIZE", default=1024, cast=int)
+
+
+def content_digest(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def image_digest(image: Image.Image) -> str:
+    digest = hashlib.sha256(f"{image.mode}:{image.width}x{image.height}:".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+class ContentCache:
+    """
+    Content-addressed cache of uploads (SHA-256 of the PDF and the raster profile settings ->
+    statement ids, as a page range or DPI override gives another statement) and pages
+    (SHA-256 of the rasterized page and the fingerprint of the OCR options -> its OCR word table
+    and text), so a change of the OCR settings never serves the output of the old ones.
+
+    Entries live in a size-bounded in-memory LRU backed by the statement_cache table, so
+    a restart only costs one table lookup per key.
+    """
+    UPLOAD = "upload"
+    PAGE = "page"
+
+    def __init__(self, max_size: int=CACHE_SIZE) -> None:
+        self.max_size = max_size
+        self.entries: Dict[str, str] = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = {self.UPLOAD: 0, self.PAGE: 0}
+        self.misses = {self.UPLOAD: 0, self.PAGE: 0}
+
+    def get_upload(self, digest: str, profile: RasterProfile) -> Optional[List[int]]:
+        digest = f"{digest}:{profile.key()}"
+        value = self.__get(self.UPLOAD, digest)
+        if value is None:
+            return None
+
+        statement_ids = json.loads(value)
+        db = SessionLocal()
+        try:
+            found = db.query(Statement.id).filter(Statement.id.in_(statement_ids)).count()
+        finally:
+            db.close()
+
+        # statements removed since, treat as a miss and let the upload be processed again
+        if found != len(statement_ids):
+            self.__invalidate(self.UPLOAD, digest)
+            return None
+        return statement_ids
+
+    def set_upload(self, digest: str, profile: RasterProfile, statement_ids: List[int]) -> None:
+        self.__set(self.UPLOAD, f"{digest}:{profile.key()}", json.dumps(statement_ids))
+
+    def get_page(self, digest: str, options: str) -> Optional[OcrPage]:
+        value = self.__get(self.PAGE, f"{digest}:{options}")
+        return OcrPage.from_json(value) if value is not None else None
+
+    def set_page(self, digest: str, options: str, page: OcrPage) -> None:
+        self.__set(self.PAGE, f"{digest}:{options}", page.to_json())
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "hits": dict(self.hits),
+                "misses": dict(self.misses),
+            }
+
+    def __get(self, kind: str, digest: str) -> Optional[str]:
+        key = f"{kind}:{digest}"
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+                self.hits[kind] += 1
+                return value
+
+        db = SessionLocal()
+        try:
+            entry = db.get(StatementCache, key)
+            value = entry.value if entry else None
+        finally:
+            db.close()
+
+        with self.lock:
+            if value is None:
+                self.misses[kind] += 1
+                return None
+            self.hits[kind] += 1
+            self.__remember(key, value)
+        return value
+
+    def __set(self, kind: str, digest: str, value: str) -> None:
+        key = f"{kind}:{digest}"
+        db = SessionLocal()
+        try:
+            db.merge(StatementCache(key=key, value=value))
+            db.commit()
+        finally:
+            db.close()
+
+        with self.lock:
+            self.__remember(key, value)
+
+    def __invalidate(self, kind: str, digest: str) -> None:
+        key = f"{kind}:{digest}"
+        with self.lock:
+            self.entries.pop(key, None)
+            self.hits[kind] -= 1
+            self.misses[kind] += 1
+
+        db = SessionLocal()
+        try:
+            db.query(StatementCache).filter(StatementCache.key == key).delete()
+            db.commit()
+        finally:
+            db.close()
+
+    def __remember(self, key: str, value: str) -> None:
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+
+content_cache = ContentCache()
@@ -0,0 +1,172 @@
+import os
+import json
+import hashlib
+
+from concurrent.futures import ProcessPoolExecutor, Future, InvalidStateError
+from concurrent.futures.process import BrokenProcessPool
+from decouple import config, Csv
+from PIL import Image
+from typing import Callable, List, Optional, Tuple, TypeVar, Union
+
+from .metrics import metrics
+from .ocr import ocr_backend
+from .statement.serializers import StatementCreate
+from .utils import CellVerifier, ImagePreprocessor, OcrPage, RegionOcr, StatementExtractor, bank_registry
+
+
+OCR_WORKERS = config("OCR_WORKERS", default=0, cast=int)
+OCR_OMP_THREADS = config("OCR_OMP_THREADS", default=0, cast=int)
+OCR_REGIONS_ONLY = config("OCR_REGIONS_ONLY", default=False, cast=bool)
+OCR_PREPROCESS = config("OCR_PREPROCESS", default="grayscale", cast=Csv())
+OCR_PREPROCESS_DPI = config("OCR_PREPROCESS_DPI", default=150, cast=int)
+OCR_VERIFY = config("OCR_VERIFY", default=False, cast=bool)
+OCR_VERIFY_CONF = config("OCR_VERIFY_CONF", default=80, cast=float)
+OCR_VERIFY_SCALE = config("OCR_VERIFY_SCALE", default=2.0, cast=float)
+
+T = TypeVar("T")
+
+
+def _init_worker(omp_threads: int, regions_only: bool) -> None:
+    if regions_only:
+        # the regions of a page are read concurrently: the worker's threads go to the region pool
+        # and each tesseract call stays single threaded
+        RegionOcr.threads, omp_threads = omp_threads, 1
+    # tesseract, spawned by pytesseract or loaded in-process by tesserocr, reads this environment,
+    # so each worker's OpenMP threads are capped and workers * threads never exceeds the core count
+    os.environ["OMP_THREAD_LIMIT"] = str(omp_threads)
+    try:
+        ocr_backend.warm_up()
+    except Exception:
+        pass # reported by the first page instead
+
+
+def _warm_up() -> int:
+    return os.getpid()
+
+
+def _run(call: Callable[[], T]) -> Tuple[T, list]:
+    # the metrics recorded in the worker go back with the result, see ExtractionEngine.__submit
+    try:
+        with metrics.collect() as samples:
+            return call(), samples
+    except (ValueError, LookupError, NotImplementedError, TimeoutError):
+        raise
+    except Exception as e:
+        # OCR backend errors can't always be unpickled in the parent and would break the whole pool
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+
+
+def _extract(source: Union[Image.Image, OcrPage], options: dict) -> Tuple[StatementCreate, list]:
+    return _run(lambda: StatementExtractor(source, **options).extract())
+
+
+def _read(source: Union[Image.Image, OcrPage], options: dict, first_page: bool,
+          bank_name: Optional[str]) -> Tuple[OcrPage, list]:
+    return _run(lambda: StatementExtractor(source, **options).read(first_page, bank_name))
+
+
+def _detect(source: Image.Image) -> Tuple[Optional[str], list]:
+    return _run(lambda: bank_registry.from_image(source))
+
+
+class ExtractionEngine:
+    """
+    Fans StatementExtractor.extract (or just the OCR of StatementExtractor.read) out across pages
+    on a pool of pre-warmed worker processes. Results are returned in page order.
+    """
+    def __init__(self, workers: Optional[int]=None, omp_threads: Optional[int]=None,
+                 single_pass: bool=True, regions_only: bool=OCR_REGIONS_ONLY,
+                 preprocessor: Optional[ImagePreprocessor]=None, verify: bool=OCR_VERIFY) -> None:
+        cpu_count = os.cpu_count() or 1
+
+        self.workers = workers or OCR_WORKERS or cpu_count
+        self.omp_threads = omp_threads or OCR_OMP_THREADS or max(1, cpu_count // self.workers)
+        self.options = {
+            "single_pass": single_pass,
+            "regions_only": regions_only,
+            "preprocessor": preprocessor or ImagePreprocessor(OCR_PREPROCESS, dpi=OCR_PREPROCESS_DPI),
+            "verifier": CellVerifier(min_conf=OCR_VERIFY_CONF, scale=OCR_VERIFY_SCALE) if verify else None,
+        }
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+        if self.workers < 1 or self.omp_threads < 1:
+            raise ValueError("Worker and thread counts must be positive")
+
+    def start(self) -> None:
+        if self.executor is not None:
+            return
+
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(self.omp_threads, self.options["regions_only"]),
+        )
+        # force every worker to spawn and run its initializer before the first upload
+        for future in [self.executor.submit(_warm_up) for _ in range(self.workers)]:
+            future.result()
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    def __submit(self, fn, *args) -> Future:
+        """
+        The worker returns its result along with the metrics it recorded: the returned future
+        resolves to the result alone, once the metrics are merged into this process.
+        """
+        self.start()
+        try:
+            future = self.executor.submit(fn, *args)
+        except BrokenProcessPool:
+            # a worker died (e.g. killed by the OOM killer), replace the pool
+            self.shutdown()
+            self.start()
+            future = self.executor.submit(fn, *args)
+
+        result = Future()
+
+        def __done(future: Future) -> None:
+            try:
+                if future.cancelled():
+                    result.cancel()
+                elif future.exception() is not None:
+                    if isinstance(future.exception(), TimeoutError):
+                        metrics.observe("timeouts", 1, stage="ocr")
+                    result.set_exception(future.exception())
+                else:
+                    value, samples = future.result()
+                    metrics.merge(samples)
+                    result.set_result(value)
+            except InvalidStateError:
+                pass # the caller cancelled the result in the meantime
+
+        # cancelling the result cancels the page if it didn't start yet
+        result.add_done_callback(lambda result: result.cancelled() and future.cancel())
+        future.add_done_callback(__done)
+        return result
+
+    def fingerprint(self, first_page: bool, bank_name: Optional[str]) -> str:
+        """
+        Digest of everything the OCR output of a page read depends on besides its pixels: the
+        backend, the pass and region options, the preprocessing steps, the verification settings,
+        and the page position and bank that select the verified cells.
+        """
+        options = {name: vars(value) if hasattr(value, "__dict__") else value for name, value in self.options.items()}
+        settings = [ocr_backend.name, options, first_page, bank_name]
+        return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:16]
+
+    def submit(self, source: Union[Image.Image, OcrPage]) -> Future:
+        return self.__submit(_extract, source, self.options)
+
+    def submit_read(self, source: Image.Image, first_page: bool=True, bank_name: Optional[str]=None) -> Future:
+        return self.__submit(_read, source, self.options, first_page, bank_name)
+
+    def submit_detect(self, source: Image.Image) -> Future:
+        return self.__submit(_detect, source)
+
+    def extract(self, sources: List[Union[Image.Image, OcrPage]]) -> List[StatementCreate]:
+        return [future.result() for future in [self.submit(source) for source in sources]]
+
+
+extraction_engine = ExtractionEngine()
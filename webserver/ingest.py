@@ -0,0 +1,310 @@
+import os
+import asyncio
+import re
+import hashlib
+import tempfile
+
+from decouple import config
+from fastapi import Request, UploadFile
+from fastapi.responses import JSONResponse
+from pdf2image import pdfinfo_from_path
+from pdf2image.exceptions import PDFInfoNotInstalledError, PDFPageCountError, PDFPopplerTimeoutError
+from typing import Optional, Tuple
+
+from .metrics import metrics
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ModuleNotFoundError: # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+
+UPLOAD_MAX_SIZE = config("UPLOAD_MAX_SIZE", default=20 * 1024 * 1024, cast=int)
+UPLOAD_MAX_PAGES = config("UPLOAD_MAX_PAGES", default=50, cast=int)
+UPLOAD_CHUNK_SIZE = config("UPLOAD_CHUNK_SIZE", default=1024 * 1024, cast=int)
+# whole request body of a batch upload
+BATCH_MAX_SIZE = config("BATCH_MAX_SIZE", default=512 * 1024 * 1024, cast=int)
+
+# room for the multipart boundaries and headers around the file
+MULTIPART_OVERHEAD = 64 * 1024
+# the PDF header may be preceded by garbage, readers look for it in the first 1024 bytes
+PDF_MAGIC = b"%PDF-"
+PDF_MAGIC_WINDOW = 1024
+# pdfinfo's "Page size" of the first page, e.g. "595.276 x 841.89 pts (A4)"
+PAGE_SIZE = re.compile(r"([\d.]+) x ([\d.]+) pts")
+A4 = (595.0, 842.0)
+
+
+class UploadRejectedError(Exception):
+    def __init__(self, message: str, status_code: int=400) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class IngestedUpload:
+    """
+    An upload streamed into a temp file (outside the working directory), with its SHA-256 digest,
+    size, page count and first page size in points computed on the way in. The temp file is
+    removed by close().
+    """
+    def __init__(self, path: str, digest: str, size: int, pages: int, page_size: Tuple[float, float]=A4,
+                 filename: Optional[str]=None) -> None:
+        self.path = path
+        self.digest = digest
+        self.size = size
+        self.pages = pages
+        self.page_size = page_size
+        self.filename = filename
+
+    def close(self) -> None:
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+        self.path = None
+
+
+class UploadSpool:
+    """
+    The temp file an upload is copied into chunk by chunk: each chunk is hashed and checked on the
+    way, so a file that is not a PDF is rejected by its first KB and one too large by the chunk that
+    passes max_size. finish() returns the IngestedUpload, discard() removes the temp file.
+    """
+    def __init__(self, max_size: int=UPLOAD_MAX_SIZE, filename: Optional[str]=None) -> None:
+        self.max_size = max_size
+        self.filename = filename
+        self.digest = hashlib.sha256()
+        self.size = 0
+        # the first bytes, until there are enough to look for the PDF header in
+        self.head: Optional[bytes] = b""
+        fd, self.path = tempfile.mkstemp(suffix=".pdf")
+        self.file = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            raise UploadRejectedError(f"Uploaded file exceeds the maximum size of {self.max_size} bytes", status_code=413)
+
+        if self.head is not None:
+            self.head += chunk[:PDF_MAGIC_WINDOW]
+            if len(self.head) >= PDF_MAGIC_WINDOW:
+                self.__check_magic()
+
+        self.digest.update(chunk)
+        self.file.write(chunk)
+
+    def finish(self) -> IngestedUpload:
+        self.file.close()
+        if self.size == 0:
+            raise UploadRejectedError("Invalid or empty PDF content")
+        if self.head is not None:
+            self.__check_magic()
+        return IngestedUpload(self.path, self.digest.hexdigest(), self.size, 0, filename=self.filename)
+
+    def discard(self) -> None:
+        self.file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __check_magic(self) -> None:
+        if PDF_MAGIC not in self.head[:PDF_MAGIC_WINDOW]:
+            raise UploadRejectedError("Uploaded file is not a PDF", status_code=415)
+        self.head = None
+
+
+async def ingest(request: Request, field: str="file", max_size: int=UPLOAD_MAX_SIZE, max_pages: int=UPLOAD_MAX_PAGES,
+                 timeout: Optional[int]=None) -> IngestedUpload:
+    """
+    Stream the file field of a multipart/form-data request body to a temp file as the request
+    chunks arrive, hashing as it goes, and reject it as soon as it is not a PDF, exceeds max_size
+    or has more than max_pages pages, before any rasterization. The body is parsed here rather
+    than by the form parsing of the framework, which would receive and spool the whole of it first.
+    pdfinfo may run for timeout seconds, see page_info.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise UploadRejectedError("Expected a multipart/form-data request body")
+
+    upload = await MultipartFile(params[b"boundary"], field, max_size).receive(request)
+    # pdfinfo runs in a thread, like every other poppler call of a request
+    await asyncio.to_thread(inspect, upload, max_pages, timeout)
+    return upload
+
+
+class MultipartFile:
+    """
+    The parser callbacks that copy the part of a multipart body holding the file of a field into an
+    UploadSpool, skipping every other part.
+    """
+    def __init__(self, boundary: bytes, field: str, max_size: int=UPLOAD_MAX_SIZE) -> None:
+        self.field = field
+        self.max_size = max_size
+        self.spool: Optional[UploadSpool] = None
+        self.done = False
+        self.receiving = False
+        self.header_field = b""
+        self.header_value = b""
+        self.headers = {}
+        self.parser = MultipartParser(boundary, {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        })
+
+    async def receive(self, request: Request) -> IngestedUpload:
+        try:
+            try:
+                async for chunk in request.stream():
+                    self.parser.write(chunk)
+                self.parser.finalize()
+            except ValueError: # the parse errors of python-multipart
+                raise UploadRejectedError("Malformed multipart/form-data request body") from None
+            if self.spool is None or not self.done:
+                raise UploadRejectedError(f"No file uploaded in the {self.field} field")
+            return self.spool.finish()
+        except BaseException:
+            if self.spool is not None:
+                self.spool.discard()
+            raise
+
+    def on_part_begin(self) -> None:
+        self.headers = {}
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self.header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self.header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        self.headers[self.header_field.lower()] = self.header_value
+        self.header_field = self.header_value = b""
+
+    def on_headers_finished(self) -> None:
+        disposition, options = parse_options_header(self.headers.get(b"content-disposition", b""))
+        # only the first file of the field is kept
+        self.receiving = (
+            self.spool is None and disposition == b"form-data" and b"filename" in options
+            and options.get(b"name", b"").decode("latin-1") == self.field
+        )
+        if self.receiving:
+            self.spool = UploadSpool(self.max_size, options[b"filename"].decode("utf-8", errors="replace"))
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self.receiving:
+            self.spool.write(data[start:end])
+
+    def on_part_end(self) -> None:
+        if self.receiving:
+            self.receiving = False
+            self.done = True
+
+
+async def spool(file: UploadFile, max_size: int=UPLOAD_MAX_SIZE) -> IngestedUpload:
+    """
+    Copy, hash and check the type and size of a file, without reading its page count yet. file is
+    anything with an async read(size): the UploadFile of a batch, already received and spooled by
+    the form parser of the framework, or a member of a zip archive.
+    """
+    upload = UploadSpool(max_size)
+    try:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            upload.write(chunk)
+        return upload.finish()
+    except BaseException:
+        upload.discard()
+        raise
+
+
+def inspect(upload: IngestedUpload, max_pages: int=UPLOAD_MAX_PAGES, timeout: Optional[int]=None) -> None:
+    """
+    Read the page count and size of a spooled upload, removing it when it is unreadable or too long.
+    """
+    try:
+        upload.pages, upload.page_size = page_info(upload.path, timeout)
+        if upload.pages > max_pages:
+            raise UploadRejectedError(f"Uploaded PDF exceeds the maximum of {max_pages} pages", status_code=413)
+    except BaseException:
+        upload.close()
+        raise
+
+
+def page_info(path: str, timeout: Optional[int]=None) -> Tuple[int, Tuple[float, float]]:
+    """
+    The page count and first page size of a PDF. pdfinfo is killed after timeout seconds (None for
+    no limit) and the upload rejected, like any PDF it can't read.
+    """
+    # pdfinfo only reads the document catalog, it does not render anything
+    try:
+        info = pdfinfo_from_path(path, timeout=timeout)
+        pages = int(info["Pages"])
+    except (PDFPageCountError, KeyError, ValueError):
+        raise UploadRejectedError("Unable to read the PDF, the file may be corrupted")
+    except PDFPopplerTimeoutError:
+        metrics.observe("timeouts", 1, stage="pdfinfo")
+        raise UploadRejectedError(f"Reading the PDF timed out after {timeout}s", status_code=422) from None
+    except PDFInfoNotInstalledError:
+        raise UploadRejectedError("PDF uploads are unavailable, poppler is not installed", status_code=503) from None
+
+    size = PAGE_SIZE.search(str(info.get("Page size", "")))
+    return pages, (float(size.group(1)), float(size.group(2))) if size else A4
+
+
+class BodyTooLargeError(Exception):
+    pass
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Reject request bodies larger than the upload limit: from their Content-Length before the
+    multipart body is even parsed, else (chunked requests) as soon as the bytes received pass the
+    limit, so the body is never buffered whole. Batch uploads get the batch limit instead.
+    """
+    def __init__(self, app, max_size: int=UPLOAD_MAX_SIZE, batch_max_size: int=BATCH_MAX_SIZE) -> None:
+        self.app = app
+        self.max_size = max_size + MULTIPART_OVERHEAD
+        self.batch_max_size = batch_max_size + MULTIPART_OVERHEAD
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT"):
+            await self.app(scope, receive, send)
+            return
+
+        max_size = self.batch_max_size if scope["path"].rstrip("/").endswith("/batch") else self.max_size
+        too_large = JSONResponse({"detail": "Request body is too large"}, status_code=413)
+        length: Optional[bytes] = dict(scope["headers"]).get(b"content-length")
+        if length and length.isdigit() and int(length) > max_size:
+            await too_large(scope, receive, send)
+            return
+
+        received = 0
+        exceeded = started = False
+
+        async def __receive() -> dict:
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_size:
+                    exceeded = True
+                    raise BodyTooLargeError()
+            return message
+
+        async def __send(message) -> None:
+            nonlocal started
+            # the body parser may turn the error into a response of its own, answer 413 instead
+            if exceeded:
+                if message["type"] == "http.response.start" and not started:
+                    started = True
+                    await too_large(scope, receive, send)
+                return
+            started = started or message["type"] == "http.response.start"
+            await send(message)
+
+        try:
+            await self.app(scope, __receive, __send)
+        except BodyTooLargeError:
+            if not started:
+                await too_large(scope, receive, send)
@@ -0,0 +1,484 @@
+import math
+import time
+import uuid
+import asyncio
+
+from collections import OrderedDict, deque
+from datetime import datetime
+from decouple import config
+from PIL import Image
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from .cache import content_cache, content_digest, image_digest
+from .database import SessionLocal
+from .engine import extraction_engine
+from .ingest import IngestedUpload, UploadRejectedError
+from .metrics import metrics
+from .statement.serializers import StatementCreate
+from .utils import OcrPage, PdfPageStream, RasterProfile, StatementExtractor, StatementState, bank_registry
+
+
+JOB_WORKERS = config("JOB_WORKERS", default=2, cast=int)
+JOB_QUEUE_SIZE = config("JOB_QUEUE_SIZE", default=100, cast=int)
+JOB_MAX_RETRIES = config("JOB_MAX_RETRIES", default=2, cast=int)
+JOB_RETRY_DELAY = config("JOB_RETRY_DELAY", default=1.0, cast=float)
+JOB_HISTORY_SIZE = config("JOB_HISTORY_SIZE", default=1000, cast=int)
+# seconds an attempt at a job may take, 0 disables the limit
+JOB_TIMEOUT = config("JOB_TIMEOUT", default=600, cast=int)
+# Retry-After seconds of a full queue before any job finished, later estimated from the job durations
+JOB_RETRY_AFTER = config("JOB_RETRY_AFTER", default=5, cast=int)
+# pixels of the pages rasterized and not OCR'd yet across all jobs, and of a single page, 0 for no limit
+OCR_PIXEL_BUDGET = config("OCR_PIXEL_BUDGET", default=100_000_000, cast=int)
+OCR_MAX_PAGE_PIXELS = config("OCR_MAX_PAGE_PIXELS", default=40_000_000, cast=int)
+# keep the OCR output of every page with its statement, so it can be parsed again without OCR
+JOB_STORE_PAGES = config("JOB_STORE_PAGES", default=True, cast=bool)
+
+RASTER_PROFILE = RasterProfile(
+    dpi=config("RASTER_DPI", default=RasterProfile.BASE_DPI, cast=int),
+    mode=config("RASTER_MODE", default="RGB"),
+    first_page=config("RASTER_FIRST_PAGE", default=1, cast=int) or None,
+    last_page=config("RASTER_LAST_PAGE", default=0, cast=int) or None,
+    thread_count=config("RASTER_THREADS", default=1, cast=int),
+    fmt=config("RASTER_FORMAT", default="ppm"),
+    timeout=config("RASTER_TIMEOUT", default=120, cast=int) or None,
+)
+
+
+class JobStatus:
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class QueueFullError(Exception):
+    def __init__(self, message: str, retry_after: int) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class JobCancelledError(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, upload: IngestedUpload, filename: Optional[str]=None, profile: Optional[RasterProfile]=None,
+                 bank_name: Optional[str]=None) -> None:
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.upload = upload
+        self.profile = profile or RASTER_PROFILE
+        self.digest = upload.digest
+        # estimated from the first page, every page is assumed the same size
+        self.page_pixels = self.profile.page_pixels(upload.page_size)
+        # detected from the PDF itself at upload time, when it could be
+        self.bank_name = bank_name
+        self.status = JobStatus.QUEUED
+        self.attempts = 0
+        self.pages_total = 0
+        self.pages_done = 0
+        self.statement_ids: List[int] = []
+        self.error: Optional[str] = None
+        # the transactions read don't add up to the statement totals
+        self.warnings: List[str] = []
+        self.created_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+        self.finished = asyncio.Event()
+        # set by JobQueue.cancel, the worker stops the job at the next page and marks it cancelled
+        self.cancel_requested = False
+
+    def finish(self, status: str, error: Optional[str]=None) -> None:
+        self.status = status
+        self.error = error
+        self.finished_at = datetime.now()
+        self.finished.set()
+
+    async def wait(self) -> None:
+        await self.finished.wait()
+
+
+class PixelBudget:
+    """
+    Bounds the pixels of the pages rasterized and not OCR'd yet, across all jobs. Pages wait for
+    room in FIFO order, a page larger than the whole budget waits for it to be empty and runs alone.
+    A max_pixels of 0 disables the budget.
+    """
+    def __init__(self, max_pixels: int=OCR_PIXEL_BUDGET) -> None:
+        self.max_pixels = max_pixels
+        self.used = 0
+        self.waiters: deque = deque()
+
+    async def acquire(self, pixels: int) -> int:
+        """
+        Wait until pixels fit in the budget and reserve them, returns the pixels to release.
+        """
+        if not self.max_pixels:
+            return 0
+
+        pixels = min(pixels, self.max_pixels)
+        if not self.waiters and self.used + pixels <= self.max_pixels:
+            self.used += pixels
+            metrics.observe("pixels_in_flight", self.used)
+            return pixels
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append((pixels, waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.cancelled():
+                # let the pages queued behind this one through
+                self.release(0)
+            else:
+                # granted just before the cancellation
+                self.release(pixels)
+            raise
+        return pixels
+
+    def release(self, pixels: int) -> None:
+        self.used -= pixels
+        while self.waiters:
+            pixels, waiter = self.waiters[0]
+            if not waiter.cancelled():
+                if self.used + pixels > self.max_pixels:
+                    break
+                self.used += pixels
+                waiter.set_result(None)
+            self.waiters.popleft()
+        metrics.observe("pixels_in_flight", self.used)
+
+
+class JobQueue:
+    """
+    In-process OCR job queue: uploads are queued with bounded depth and processed by a fixed number
+    of asyncio workers, which offload rasterization, OCR and persistence so the event loop stays free.
+
+    Admission control: a full queue turns uploads away with an estimate of when to retry, uploads
+    whose pages would render larger than max_page_pixels are rejected, and pages are only rasterized
+    once they fit the pixel budget shared by all jobs. Each attempt at a job is stopped after timeout
+    seconds.
+
+    Jobs failing with anything other than a parsing error (ValueError/LookupError) or a timeout are
+    retried up to max_retries times. Queued or running jobs can be cancelled, running jobs stop at
+    the next page.
+    """
+    PERMANENT_ERRORS = (ValueError, LookupError, NotImplementedError, TimeoutError)
+
+    def __init__(self, workers: int=JOB_WORKERS, max_size: int=JOB_QUEUE_SIZE,
+                 max_retries: int=JOB_MAX_RETRIES, history_size: int=JOB_HISTORY_SIZE,
+                 timeout: int=JOB_TIMEOUT, max_page_pixels: int=OCR_MAX_PAGE_PIXELS,
+                 pixel_budget: int=OCR_PIXEL_BUDGET) -> None:
+        self.workers = workers
+        self.max_size = max_size
+        self.max_retries = max_retries
+        self.history_size = history_size
+        self.timeout = timeout
+        self.max_page_pixels = max_page_pixels
+        self.budget = PixelBudget(pixel_budget)
+        self.jobs: Dict[str, Job] = OrderedDict()
+        self.queue: Optional[asyncio.Queue] = None
+        self.tasks: List[asyncio.Task] = []
+        self.running = 0
+        # moving average of the job durations, for the Retry-After of a full queue
+        self.job_seconds: Optional[float] = None
+
+    def start(self) -> None:
+        if self.tasks:
+            return
+
+        self.queue = asyncio.Queue(maxsize=self.max_size)
+        self.tasks = [asyncio.create_task(self.__work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+        # the workers are stopped, close the uploads of the jobs they never picked up
+        for job in self.jobs.values():
+            if job.status not in JobStatus.FINISHED:
+                job.finish(JobStatus.CANCELLED, "Service shut down")
+                job.upload.close()
+
+    def submit(self, upload: IngestedUpload, filename: Optional[str]=None, profile: Optional[RasterProfile]=None,
+               bank_name: Optional[str]=None) -> Job:
+        if self.queue is None:
+            raise RuntimeError("Job queue is not started")
+
+        job = Job(upload, filename, profile, bank_name)
+        if not job.profile.page_numbers(upload.pages):
+            raise UploadRejectedError(f"No pages to read, the PDF has {upload.pages} pages but the page range "
+                                      f"starts at page {job.profile.first_page}")
+        if self.max_page_pixels and job.page_pixels > self.max_page_pixels:
+            metrics.observe("rejected", 1, reason="page_pixels")
+            raise UploadRejectedError(f"Pages rendered at {job.profile.dpi} DPI exceed the maximum of "
+                                      f"{self.max_page_pixels} pixels, please use a lower DPI", status_code=413)
+
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            # the upload stays with the caller, to retry or close
+            raise QueueFullError("Too many statements are being processed, please retry later", self.retry_after())
+
+        self.jobs[job.id] = job
+        self.__evict()
+        self.__observe()
+        return job
+
+    def settled(self, upload: IngestedUpload, statement_ids: List[int], filename: Optional[str]=None,
+                profile: Optional[RasterProfile]=None) -> Job:
+        """
+        A job done at once with the statements of an upload processed before, kept in the history
+        for polling like any other job. It never goes through the queue.
+        """
+        job = Job(upload, filename, profile)
+        job.statement_ids = statement_ids
+        job.finish(JobStatus.DONE)
+        upload.close()
+        self.jobs[job.id] = job
+        self.__evict()
+        return job
+
+    def retry_after(self) -> int:
+        """
+        Seconds until the queue likely has room: a queued job starts whenever one of the workers
+        finishes a job.
+        """
+        if self.job_seconds is None:
+            return JOB_RETRY_AFTER
+        return max(1, math.ceil(self.job_seconds / self.workers))
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Ask for the job to stop. Only its worker settles it, once the job is no longer using its
+        upload: a queued job when it is picked up, a running one at the next page.
+        """
+        job = self.jobs.get(job_id)
+        if job is not None and job.status not in JobStatus.FINISHED:
+            job.cancel_requested = True
+        return job
+
+    def __evict(self) -> None:
+        # keep a bounded history of settled jobs, oldest first
+        for job_id in list(self.jobs):
+            if len(self.jobs) <= self.history_size:
+                break
+            if self.jobs[job_id].status in JobStatus.FINISHED:
+                del self.jobs[job_id]
+
+    def __observe(self) -> None:
+        metrics.observe("queue_depth", self.queue.qsize())
+        metrics.observe("jobs_running", self.running)
+
+    async def __work(self) -> None:
+        while True:
+            job = await self.queue.get()
+            self.running += 1
+            self.__observe()
+            try:
+                await self.__run(job)
+            finally:
+                # the only place the upload is removed, nothing reads it anymore
+                job.upload.close()
+                self.running -= 1
+                self.queue.task_done()
+                self.__observe()
+
+    async def __run(self, job: Job) -> None:
+        while not job.cancel_requested:
+            job.status = JobStatus.RUNNING
+            job.attempts += 1
+            if job.attempts == 1:
+                metrics.observe("stage", (datetime.now() - job.created_at).total_seconds(), stage="queue")
+            start = time.perf_counter()
+            try:
+                with metrics.stage("job"):
+                    async with asyncio.timeout(self.timeout or None) as deadline:
+                        job.statement_ids = await self.__process(job)
+                job.finish(JobStatus.DONE)
+                seconds = time.perf_counter() - start
+                self.job_seconds = seconds if self.job_seconds is None else 0.8 * self.job_seconds + 0.2 * seconds
+            except JobCancelledError:
+                job.finish(JobStatus.CANCELLED)
+            except self.PERMANENT_ERRORS as e:
+                error = str(e)
+                if deadline.expired():
+                    metrics.observe("timeouts", 1, stage="job")
+                    error = f"Processing timed out after {self.timeout}s"
+                job.finish(JobStatus.FAILED, error)
+            except Exception as e:
+                if job.attempts <= self.max_retries and not job.cancel_requested:
+                    job.status = JobStatus.QUEUED
+                    await asyncio.sleep(JOB_RETRY_DELAY * job.attempts)
+                    continue
+                job.finish(JobStatus.CANCELLED if job.cancel_requested else JobStatus.FAILED, str(e))
+            return
+
+        # cancelled while queued or waiting for a retry
+        job.finish(JobStatus.CANCELLED)
+
+    async def __process(self, job: Job) -> List[int]:
+        """
+        Stream the pages one at a time: pages are read (text layer or rasterized) lazily, at most
+        one page per OCR worker is in flight, and pages are parsed in order and persisted as they
+        finish, so memory stays flat whatever the number of pages.
+        """
+        # the same PDF was already processed, point to its statements instead
+        statement_ids = await asyncio.to_thread(content_cache.get_upload, job.digest, job.profile)
+        if statement_ids is not None:
+            return statement_ids
+
+        stream = await asyncio.to_thread(PdfPageStream, job.upload.path, job.profile, job.upload.pages)
+        sources = iter(stream)
+        job.pages_total = len(stream)
+        job.pages_done = 0
+        if not job.pages_total:
+            # failed rather than done with no statement, and never cached
+            raise ValueError("No pages to read in the page range of the upload")
+
+        state = StatementState()
+        statement_id: Optional[int] = None
+        pending = deque()
+        try:
+            # reject unsupported statements on the first page header before any full-page OCR
+            source, reserved = await self.__next_page(sources, job.page_pixels)
+            try:
+                state.bank_name = job.bank_name or await JobQueue.detect_bank(source)
+            except BaseException:
+                self.budget.release(reserved)
+                raise
+            pending.append(self.__reading(JobQueue.read_page(source, True, state.bank_name), reserved))
+
+            for page_index in range(job.pages_total):
+                while len(pending) < extraction_engine.workers and page_index + len(pending) < job.pages_total:
+                    source, reserved = await self.__next_page(sources, job.page_pixels)
+                    first_page = page_index + len(pending) == 0
+                    pending.append(self.__reading(JobQueue.read_page(source, first_page, state.bank_name), reserved))
+
+                page, digest = await pending.popleft()
+                transactions = await asyncio.to_thread(StatementExtractor(page).parse, page, state)
+
+                if statement_id is None:
+                    statement_id, = await asyncio.to_thread(JobQueue.persist, [state.to_statement(transactions)])
+                    job.statement_ids = [statement_id]
+                else:
+                    await asyncio.to_thread(JobQueue.persist_page, statement_id, transactions)
+                if JOB_STORE_PAGES:
+                    # the PDF page number, the profile's page window may start past the first page
+                    await asyncio.to_thread(JobQueue.store_page, statement_id, stream.page_numbers[page_index], digest, page)
+
+                job.pages_done += 1
+                if job.cancel_requested:
+                    raise JobCancelledError()
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            # don't leave a statement with only part of its pages behind
+            if statement_id is not None:
+                await asyncio.to_thread(JobQueue.discard, statement_id)
+                job.statement_ids = []
+            raise
+
+        if state.setting is not None:
+            job.warnings = state.check()
+
+        statement_ids = [statement_id] if statement_id is not None else []
+        await asyncio.to_thread(content_cache.set_upload, job.digest, job.profile, statement_ids)
+        return statement_ids
+
+    async def __next_page(self, sources: Iterator[Union[Image.Image, OcrPage]],
+                          pixels: int) -> Tuple[Union[Image.Image, OcrPage], int]:
+        """
+        The next page of the stream, read once its pixels fit the budget, and the pixels reserved.
+        They stay reserved until the page is OCR'd, text layer pages give them back at once.
+        """
+        reserved = await self.budget.acquire(pixels)
+        try:
+            source = await asyncio.to_thread(next, sources)
+        except BaseException:
+            self.budget.release(reserved)
+            raise
+
+        if isinstance(source, OcrPage):
+            self.budget.release(reserved)
+            reserved = 0
+        return source, reserved
+
+    def __reading(self, read, reserved: int) -> asyncio.Future:
+        # pages finishing, failing or cancelled all give their pixels back
+        future = asyncio.ensure_future(read)
+        future.add_done_callback(lambda _: self.budget.release(reserved))
+        return future
+
+    @staticmethod
+    async def detect_bank(source: Union[Image.Image, OcrPage]) -> Optional[str]:
+        """
+        The bank of a first page from its text layer or its OCR'd header crop. None leaves the
+        detection to the parsing of the full page.
+        """
+        with metrics.stage("detect_header"):
+            if isinstance(source, OcrPage):
+                return bank_registry.check(source.text_in(bank_registry.HEADER))
+            return await asyncio.wrap_future(extraction_engine.submit_detect(source))
+
+    @staticmethod
+    async def read_page(source: Union[Image.Image, OcrPage], first_page: bool,
+                        bank_name: Optional[str]=None) -> Tuple[OcrPage, str]:
+        """
+        The page and its digest. Text layer pages are used as is, rasterized pages are OCR'd on the
+        extraction engine unless the same page was OCR'd before.
+        """
+        if isinstance(source, OcrPage):
+            return source, await asyncio.to_thread(lambda: content_digest(source.to_json().encode()))
+
+        digest = await asyncio.to_thread(image_digest, source)
+        options = extraction_engine.fingerprint(first_page, bank_name)
+        page = await asyncio.to_thread(content_cache.get_page, digest, options)
+        if page is None:
+            page = await asyncio.wrap_future(extraction_engine.submit_read(source, first_page, bank_name))
+            await asyncio.to_thread(content_cache.set_page, digest, options, page)
+        return page, digest
+
+    @staticmethod
+    def persist(statements: List[StatementCreate]) -> List[int]:
+        db = SessionLocal()
+        try:
+            with metrics.stage("persist"):
+                return StatementCreate.bulk_create(statements, db)
+        finally:
+            db.close()
+
+    @staticmethod
+    def persist_page(statement_id: int, transactions: List[dict]) -> None:
+        db = SessionLocal()
+        try:
+            with metrics.stage("persist"):
+                StatementCreate.append_transactions(statement_id, transactions, db)
+        finally:
+            db.close()
+
+    @staticmethod
+    def store_page(statement_id: int, page_number: int, digest: str, page: OcrPage) -> None:
+        db = SessionLocal()
+        try:
+            with metrics.stage("store_page"):
+                StatementCreate.add_page(statement_id, page_number, digest, page.to_artifact(), db)
+        finally:
+            db.close()
+
+    @staticmethod
+    def discard(statement_id: int) -> None:
+        db = SessionLocal()
+        try:
+            StatementCreate.delete(statement_id, db)
+        finally:
+            db.close()
+
+job_queue = JobQueue()
@@ -0,0 +1,297 @@
+import sys
+import time
+import threading
+import contextvars
+
+from collections import Counter as Tally
+from contextlib import contextmanager
+from decouple import config
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+METRICS_SERVER_TIMING = config("METRICS_SERVER_TIMING", default=False, cast=bool)
+PROFILER_ENABLED = config("PROFILER_ENABLED", default=False, cast=bool)
+PROFILER_INTERVAL = config("PROFILER_INTERVAL", default=0.01, cast=float)
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PIXEL_BUCKETS = (1e4, 1e5, 5e5, 1e6, 2e6, 4e6, 8e6, 16e6)
+
+# (kind, labels, value) samples recorded while a collect() block is active
+_collected: contextvars.ContextVar[Optional[List[tuple]]] = contextvars.ContextVar("collected", default=None)
+# (stage, seconds) of the current request, for the Server-Timing header
+_timings: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar("timings", default=None)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Labels, extra: str="") -> str:
+    pairs = [f'{key}="{value}"' for key, value in labels]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...]=DURATION_BUCKETS) -> None:
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.series: Dict[Labels, list] = {}
+
+    def observe(self, value: float, labels: Labels=()) -> None:
+        # per series: a count per bucket (non-cumulative), the sum and the total count
+        series = self.series.setdefault(labels, [[0] * len(self.buckets), 0.0, 0])
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                le = f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{_labels(labels, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(labels, le)} {count}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {total:.6f}")
+            lines.append(f"{self.name}_count{_labels(labels)} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str) -> None:
+        self.name = name
+        self.help = help
+        self.series: Dict[Labels, float] = {}
+
+    def observe(self, value: float, labels: Labels=()) -> None:
+        self.series[labels] = self.series.get(labels, 0) + value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.series.items()):
+            lines.append(f"{self.name}{_labels(labels)} {value:g}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, help: str) -> None:
+        self.name = name
+        self.help = help
+        self.series: Dict[Labels, float] = {}
+
+    def observe(self, value: float, labels: Labels=()) -> None:
+        self.series[labels] = value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for labels, value in sorted(self.series.items()):
+            lines.append(f"{self.name}{_labels(labels)} {value:g}")
+        return lines
+
+
+class Metrics:
+    """
+    Process-wide latency and work metrics, rendered in the Prometheus text format.
+
+    Stages run in the OCR worker processes are recorded there inside collect() and merged into
+    the web process registry when their result comes back, see ExtractionEngine.
+    """
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.metrics = {
+            "stage": Histogram("statement_stage_seconds", "Duration of each extraction stage."),
+            "request": Histogram("http_request_duration_seconds", "Duration of the HTTP requests by route."),
+            "db": Histogram("db_query_seconds", "Duration of the database statements."),
+            "pixels": Histogram("ocr_pixels", "Pixels passed to each Tesseract call.", PIXEL_BUCKETS),
+            "tesseract": Counter("tesseract_calls_total", "Tesseract calls by function."),
+            "verify": Counter("ocr_verified_tokens_total", "Tokens read again by the verification, by cell and outcome."),
+            "check": Counter("statement_total_checks_total", "Transaction sums checked against the statement totals, by result."),
+            "queue_depth": Gauge("job_queue_depth", "Jobs waiting in the upload job queue."),
+            "jobs_running": Gauge("jobs_running", "Jobs being processed."),
+            "pixels_in_flight": Gauge("ocr_pixels_in_flight", "Pixels of the pages rasterized and not OCR'd yet, held against the pixel budget."),
+            "rejected": Counter("admission_rejected_total", "Uploads turned away by the admission control, by reason."),
+            "timeouts": Counter("stage_timeouts_total", "Stages stopped by their timeout, by stage."),
+        }
+
+    def observe(self, kind: str, value: float, **labels: str) -> None:
+        labels = tuple(sorted(labels.items()))
+        with self.lock:
+            self.metrics[kind].observe(value, labels)
+
+        collected = _collected.get()
+        if collected is not None:
+            collected.append((kind, labels, value))
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe("stage", elapsed, stage=name)
+            self.add_timing(name, elapsed)
+
+    @staticmethod
+    def add_timing(name: str, seconds: float) -> None:
+        # only set while serving a request, see ServerTimingMiddleware
+        timings = _timings.get()
+        if timings is not None:
+            timings.append((name, seconds))
+
+    @contextmanager
+    def tesseract(self, call: str, image) -> Iterator[None]:
+        self.observe("tesseract", 1, call=call)
+        self.observe("pixels", image.width * image.height)
+        with self.stage("tesseract"):
+            yield
+
+    @contextmanager
+    def collect(self) -> Iterator[List[tuple]]:
+        samples = []
+        token = _collected.set(samples)
+        try:
+            yield samples
+        finally:
+            _collected.reset(token)
+
+    def merge(self, samples: List[tuple]) -> None:
+        with self.lock:
+            for kind, labels, value in samples:
+                self.metrics[kind].observe(value, labels)
+
+    def render(self) -> str:
+        with self.lock:
+            lines = [line for metric in self.metrics.values() for line in metric.render()]
+        return "\n".join(lines) + "\n"
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of every thread of the web process at a fixed interval, so it can be turned
+    on in production to find hot spots. Work done in the OCR worker processes is not sampled.
+    """
+    def __init__(self, interval: float=PROFILER_INTERVAL) -> None:
+        self.interval = interval
+        self.thread: Optional[threading.Thread] = None
+        self.running = threading.Event()
+        # guards the tallies, updated by the sampling thread while report() reads them
+        self.lock = threading.Lock()
+        self.own_samples = Tally()
+        self.total_samples = Tally()
+        self.samples = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.thread is not None
+
+    def start(self) -> None:
+        if self.thread is not None:
+            return
+        self.running.set()
+        self.thread = threading.Thread(target=self.__sample, name="sampling-profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        if self.thread is None:
+            return
+        self.running.clear()
+        self.thread.join()
+        self.thread = None
+
+    def reset(self) -> None:
+        with self.lock:
+            self.own_samples.clear()
+            self.total_samples.clear()
+            self.samples = 0
+
+    def __sample(self) -> None:
+        me = threading.get_ident()
+        while self.running.is_set():
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                own = self.__name(frame)
+                # a recursive function counts once per sample in the cumulative count
+                seen = set()
+                while frame is not None:
+                    seen.add(self.__name(frame))
+                    frame = frame.f_back
+                with self.lock:
+                    self.own_samples[own] += 1
+                    self.total_samples.update(seen)
+                    self.samples += 1
+            time.sleep(self.interval)
+
+    @staticmethod
+    def __name(frame) -> str:
+        code = frame.f_code
+        return f"{code.co_filename}:{code.co_firstlineno}({code.co_name})"
+
+    def report(self, top: int=30) -> dict:
+        # ranked on a snapshot, the sampling thread keeps adding functions meanwhile
+        with self.lock:
+            own_samples = self.own_samples.copy()
+            total_samples = self.total_samples.copy()
+            count = self.samples
+        samples = max(count, 1)
+        return {
+            "enabled": self.enabled,
+            "interval": self.interval,
+            "samples": count,
+            "functions": [
+                {
+                    "function": name,
+                    "own": round(own / samples, 4),
+                    "total": round(total_samples[name] / samples, 4),
+                }
+                for name, own in own_samples.most_common(top)
+            ],
+        }
+
+
+class ServerTimingMiddleware:
+    """
+    Record the duration of every request by route and, when enabled, report the stages timed
+    during the request in a Server-Timing response header.
+    """
+    def __init__(self, app, enabled: bool=METRICS_SERVER_TIMING) -> None:
+        self.app = app
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        timings: List[Tuple[str, float]] = []
+        token = _timings.set(timings)
+
+        async def __send(message) -> None:
+            if message["type"] == "http.response.start" and self.enabled:
+                totals: Dict[str, float] = {}
+                for name, seconds in timings:
+                    totals[name] = totals.get(name, 0.0) + seconds
+                entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items()]
+                entries.append(f"total;dur={(time.perf_counter() - start) * 1000:.1f}")
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", ", ".join(entries).encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, __send)
+        finally:
+            _timings.reset(token)
+            # the route template, not the path, so /statements/{statement_id} is a single series
+            route = getattr(scope.get("route"), "path", "unmatched")
+            metrics.observe("request", time.perf_counter() - start, method=scope["method"], route=route)
+
+
+metrics = Metrics()
+profiler = SamplingProfiler()
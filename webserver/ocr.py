@@ -0,0 +1,170 @@
+import shlex
+import importlib.util
+import threading
+import pytesseract
+
+from abc import ABC, abstractmethod
+from decouple import config
+from PIL import Image
+from typing import Dict, Optional, Tuple
+
+from .metrics import metrics
+from .words import WordTable
+
+
+# auto picks tesserocr when it is installed, else pytesseract
+OCR_BACKEND = config("OCR_BACKEND", default="auto")
+# seconds a single Tesseract call may take, 0 disables the limit
+OCR_TIMEOUT = config("OCR_TIMEOUT", default=60.0, cast=float)
+
+
+def parse_config(options: str) -> Tuple[Optional[int], Dict[str, str]]:
+    """
+    The page segmentation mode and the -c variables of a tesseract command line config.
+    """
+    psm, variables = None, {}
+    tokens = shlex.split(options or "")
+    for i, token in enumerate(tokens[:-1]):
+        if token == "--psm":
+            psm = int(tokens[i + 1])
+        elif token == "-c":
+            name, _, value = tokens[i + 1].partition("=")
+            variables[name] = value
+    return psm, variables
+
+
+class OcrBackend(ABC):
+    """
+    Runs Tesseract on a PIL image. image_to_data parses the TSV output into a WordTable, whatever
+    the backend. A call running longer than timeout seconds raises TimeoutError.
+    """
+    name = ""
+
+    def __init__(self, timeout: float=OCR_TIMEOUT) -> None:
+        self.timeout = timeout
+
+    def image_to_data(self, image: Image.Image, lang: Optional[str]=None, config: str="") -> WordTable:
+        with metrics.tesseract("image_to_data", image):
+            return WordTable.from_tsv(self._image_to_tsv(image, lang, config))
+
+    def image_to_string(self, image: Image.Image, lang: Optional[str]=None, config: str="") -> str:
+        with metrics.tesseract("image_to_string", image):
+            return self._image_to_string(image, lang, config)
+
+    def warm_up(self) -> None:
+        pass
+
+    @abstractmethod
+    def _image_to_tsv(self, image: Image.Image, lang: Optional[str], config: str) -> str: ...
+
+    @abstractmethod
+    def _image_to_string(self, image: Image.Image, lang: Optional[str], config: str) -> str: ...
+
+
+class PytesseractBackend(OcrBackend):
+    """
+    Spawns a tesseract process per call: the image goes through a temp file and the language
+    model is loaded again every time.
+    """
+    name = "pytesseract"
+
+    def warm_up(self) -> None:
+        try:
+            pytesseract.get_tesseract_version()
+        except pytesseract.TesseractNotFoundError:
+            pass
+
+    def _image_to_tsv(self, image: Image.Image, lang: Optional[str], config: str) -> str:
+        return self.__run(pytesseract.image_to_data, image, lang, config)
+
+    def _image_to_string(self, image: Image.Image, lang: Optional[str], config: str) -> str:
+        return self.__run(pytesseract.image_to_string, image, lang, config)
+
+    def __run(self, function, image: Image.Image, lang: Optional[str], config: str) -> str:
+        try:
+            return function(image, lang=lang, config=config, timeout=self.timeout)
+        except RuntimeError as e:
+            # pytesseract kills the process and raises a bare RuntimeError on timeout
+            if str(e) != "Tesseract process timeout":
+                raise
+            raise TimeoutError(f"OCR timed out after {self.timeout:g}s") from None
+
+
+class TesserocrBackend(OcrBackend):
+    """
+    Keeps initialised libtesseract APIs in the process through tesserocr, one per thread and
+    per (lang, psm, variables) so settings never leak between calls, and hands them the pixel
+    buffer directly: no process spawn, temp file nor model reload per call.
+    """
+    name = "tesserocr"
+
+    def __init__(self, timeout: float=OCR_TIMEOUT) -> None:
+        if importlib.util.find_spec("tesserocr") is None:
+            raise ImportError("tesserocr is not installed")
+
+        super().__init__(timeout)
+
+        # libtesseract is only loaded on first use, in the OCR worker, once OMP_THREAD_LIMIT is set
+        self.tesserocr = None
+        self.local = threading.local()
+
+    def api(self, lang: Optional[str], config: str):
+        if self.tesserocr is None:
+            self.tesserocr = importlib.import_module("tesserocr")
+
+        psm, variables = parse_config(config)
+        key = (lang or "eng", psm, tuple(sorted(variables.items())))
+
+        apis = getattr(self.local, "apis", None)
+        if apis is None:
+            apis = self.local.apis = {}
+
+        if key not in apis:
+            api = self.tesserocr.PyTessBaseAPI(lang=key[0])
+            if psm is not None:
+                api.SetPageSegMode(psm)
+            for name, value in variables.items():
+                api.SetVariable(name, value)
+            apis[key] = api
+        return apis[key]
+
+    def warm_up(self) -> None:
+        # load the default model once, before the first page
+        self.api(None, "")
+
+    def _image_to_tsv(self, image: Image.Image, lang: Optional[str], config: str) -> str:
+        api = self.__recognize(image, lang, config)
+        # the same rows as the tesseract tsv output, without its header line
+        return api.GetTSVText(0)
+
+    def _image_to_string(self, image: Image.Image, lang: Optional[str], config: str) -> str:
+        return self.__recognize(image, lang, config).GetUTF8Text()
+
+    def __recognize(self, image: Image.Image, lang: Optional[str], config: str):
+        api = self.api(lang, config)
+        api.SetImage(image)
+        # libtesseract stops at the deadline (milliseconds, 0 for none) and reports the failure
+        if not api.Recognize(int(self.timeout * 1000)):
+            raise TimeoutError(f"OCR timed out after {self.timeout:g}s")
+        return api
+
+
+BACKENDS = {
+    PytesseractBackend.name: PytesseractBackend,
+    TesserocrBackend.name: TesserocrBackend,
+}
+
+
+def create_backend(name: str=OCR_BACKEND) -> OcrBackend:
+    if name == "auto":
+        try:
+            return TesserocrBackend()
+        except ImportError:
+            return PytesseractBackend()
+
+    if name not in BACKENDS:
+        raise ValueError(f"Invalid OCR backend, supports only {['auto'] + list(BACKENDS)}")
+    return BACKENDS[name]()
+
+
+ocr_backend = create_backend()
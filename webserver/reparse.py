@@ -0,0 +1,168 @@
+"""
+Parse stored statements again from the OCR output kept with them (statement_pages), without any
+OCR: after a fix to a bank setting's patterns or coordinates, only get_address, get_statement_date,
+get_total and get_transaction run again. Statements are parsed in batches on a process pool, the
+ones that changed are updated in place and their differences reported. Statements processed before
+the pages were stored are skipped.
+
+Usage: python -m webserver.reparse [--bank PUBLIC] [--statement-id 1 2 ...] [--batch-size 100]
+                                   [--workers 4] [--dry-run]
+"""
+import os
+import time
+import argparse
+
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import select
+from typing import Iterator, List, Optional, Tuple
+
+from .database import SessionLocal
+from .statement.models import Statement, StatementPage
+from .statement.serializers import StatementCreate
+from .utils import OcrPage, StatementExtractor, StatementState
+
+
+def reparse(name: str, artifacts: List[bytes]) -> StatementCreate:
+    """
+    The statement extracted from the stored pages, with the bank it was stored under.
+    """
+    state = StatementState()
+    state.bank_name = name
+    transactions = []
+    for artifact in artifacts:
+        page = OcrPage.from_artifact(artifact)
+        transactions += StatementExtractor(page).parse(page, state)
+    return state.to_statement(transactions)
+
+
+def _reparse_batch(batch: List[Tuple[int, str, List[bytes]]]) -> List[Tuple[int, Optional[StatementCreate], Optional[str]]]:
+    results = []
+    for statement_id, name, artifacts in batch:
+        try:
+            results.append((statement_id, reparse(name, artifacts), None))
+        except (ValueError, LookupError, NotImplementedError) as e:
+            results.append((statement_id, None, f"{type(e).__name__}: {e}"))
+    return results
+
+
+def diff(old: StatementCreate, new: StatementCreate) -> List[str]:
+    """
+    The fields of the statement that changed, and the transactions added and removed, compared as
+    a multiset of (date, amount).
+    """
+    changes = []
+    for field in ("address", "name", "statement_date"):
+        if getattr(old, field) != getattr(new, field):
+            changes.append(f"{field}: {getattr(old, field)!r} -> {getattr(new, field)!r}")
+    for field, value in old.detail.model_dump().items():
+        if round(value, 2) != round(getattr(new.detail, field), 2):
+            changes.append(f"{field}: {value} -> {getattr(new.detail, field)}")
+
+    def __key(transaction) -> tuple:
+        return transaction.transaction_date, round(transaction.amount, 2)
+
+    before = Counter(__key(transaction) for transaction in old.transactions)
+    after = Counter(__key(transaction) for transaction in new.transactions)
+    added, removed = sum((after - before).values()), sum((before - after).values())
+    if added or removed:
+        changes.append(f"transactions: +{added} -{removed}")
+    return changes
+
+
+class Reparser:
+    """
+    Loads the stored pages of the selected statements batch by batch, parses them on a process
+    pool with at most two batches per worker in flight, and writes the changed statements back.
+    """
+    def __init__(self, bank: Optional[str]=None, statement_ids: Optional[List[int]]=None,
+                 batch_size: int=100, workers: Optional[int]=None, dry_run: bool=False) -> None:
+        if batch_size < 1:
+            raise ValueError("Batch size must be positive")
+
+        self.bank = bank
+        self.statement_ids = statement_ids
+        self.batch_size = batch_size
+        self.workers = workers or os.cpu_count() or 1
+        self.dry_run = dry_run
+        self.totals = Counter()
+
+    def selected(self) -> List[int]:
+        query = select(Statement.id).where(Statement.id.in_(select(StatementPage.statement_id))).order_by(Statement.id)
+        if self.bank:
+            query = query.where(Statement.name == self.bank)
+        if self.statement_ids:
+            query = query.where(Statement.id.in_(self.statement_ids))
+
+        db = SessionLocal()
+        try:
+            return list(db.execute(query).scalars())
+        finally:
+            db.close()
+
+    def batches(self, statement_ids: List[int]) -> Iterator[Tuple[dict, List[Tuple[int, str, List[bytes]]]]]:
+        for start in range(0, len(statement_ids), self.batch_size):
+            ids = statement_ids[start:start + self.batch_size]
+            db = SessionLocal()
+            try:
+                stored = StatementCreate.fetch(ids, db)
+                pages = StatementCreate.fetch_pages(ids, db)
+            finally:
+                db.close()
+            yield stored, [(statement_id, stored[statement_id].name, pages[statement_id])
+                           for statement_id in ids if statement_id in pages]
+
+    def run(self) -> Counter:
+        statement_ids = self.selected()
+        print(f"{len(statement_ids)} statements with stored pages")
+
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            for stored, batch in self.batches(statement_ids):
+                pending.append((stored, executor.submit(_reparse_batch, batch)))
+                while len(pending) >= self.workers * 2:
+                    self.__apply(*pending.popleft())
+            while pending:
+                self.__apply(*pending.popleft())
+        return self.totals
+
+    def __apply(self, stored: dict, future) -> None:
+        db = SessionLocal()
+        try:
+            for statement_id, statement, error in future.result():
+                self.totals["parsed"] += 1
+                if statement is None:
+                    self.totals["failed"] += 1
+                    print(f"statement {statement_id}: failed, {error}")
+                    continue
+
+                changes = diff(stored[statement_id], statement)
+                if not changes:
+                    self.totals["unchanged"] += 1
+                    continue
+
+                self.totals["changed"] += 1
+                print(f"statement {statement_id}: " + "; ".join(changes))
+                if not self.dry_run:
+                    StatementCreate.replace(statement_id, statement, db)
+        finally:
+            db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Parse stored statements again from their stored OCR pages.")
+    parser.add_argument("--bank", help="only the statements of this bank, e.g. PUBLIC")
+    parser.add_argument("--statement-id", type=int, nargs="+", dest="statement_ids")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--dry-run", action="store_true", help="report the differences without updating")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    totals = Reparser(args.bank, args.statement_ids, args.batch_size, args.workers, args.dry_run).run()
+    print(f"{totals['parsed']} parsed, {totals['changed']} changed, {totals['unchanged']} unchanged, "
+          f"{totals['failed']} failed in {time.perf_counter() - start:.1f}s" + (" (dry run)" if args.dry_run else ""))
+
+
+if __name__ == "__main__":
+    main()
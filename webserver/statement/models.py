@@ -1,6 +1,6 @@
 from datetime import datetime
 from sqlalchemy.orm import relationship
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float, Text, Index, LargeBinary, UniqueConstraint
 
 from ..database import Base
 
@@ -16,6 +16,13 @@ class Statement(Base):
 
     detail = relationship("StatementDetails", back_populates="statement", uselist=False)
     transactions = relationship("StatementTransaction", back_populates="statement")
+    pages = relationship("StatementPage", back_populates="statement", order_by="StatementPage.page_number")
+
+    # keyset pagination of the statement list, optionally filtered by bank name
+    __table_args__ = (
+        Index("ix_statement_statement_date_id", "statement_date", "id"),
+        Index("ix_statement_name_statement_date_id", "name", "statement_date", "id"),
+    )
 
 
 class StatementDetails(Base):
@@ -37,7 +44,7 @@ class StatementTransaction(Base):
     __tablename__ = "statement_transactions"
 
     id = Column(Integer, primary_key=True, index=True)
-    statement_id = Column(Integer, ForeignKey('statement.id'))
+    statement_id = Column(Integer, ForeignKey('statement.id'), index=True)
     transaction_date = Column(DateTime)
     amount = Column(Float)
     created_at = Column(DateTime, default=datetime.now())
@@ -45,3 +52,30 @@ class StatementTransaction(Base):
     statement = relationship("Statement", back_populates="transactions")
 
 
+class StatementPage(Base):
+    """
+    The OCR output of a page of a statement (zlib compressed OcrPage JSON), so the statement can be
+    parsed again without OCR. digest is the hash of the page image, or of the text layer.
+    """
+    __tablename__ = "statement_pages"
+
+    id = Column(Integer, primary_key=True, index=True)
+    statement_id = Column(Integer, ForeignKey('statement.id'), index=True)
+    page_number = Column(Integer)
+    digest = Column(String(64), index=True)
+    ocr = Column(LargeBinary)
+    created_at = Column(DateTime, default=datetime.now())
+
+    statement = relationship("Statement", back_populates="pages")
+
+    __table_args__ = (
+        UniqueConstraint("statement_id", "page_number"),
+    )
+
+
+class StatementCache(Base):
+    __tablename__ = "statement_cache"
+
+    key = Column(String, primary_key=True)
+    value = Column(Text)
+    created_at = Column(DateTime, default=datetime.now())
@@ -1,9 +1,13 @@
+import base64
+import orjson
+
 from pydantic import BaseModel
 from datetime import datetime
-from typing import List
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import delete, insert, select, update, Row, Select
 from sqlalchemy.orm import Session
 
-from .models import Statement, StatementDetails, StatementTransaction
+from .models import Statement, StatementDetails, StatementPage, StatementTransaction
 
 class StatementDetailCreate(BaseModel):
     total_debit: float
@@ -54,12 +58,183 @@ class StatementCreate(BaseModel):
 
         return statement
 
+    @staticmethod
+    def bulk_create(statements_data: List["StatementCreate"], db: Session) -> List[int]:
+        """
+        Persist the statements of an upload in a single transaction with batched inserts,
+        returning the statement ids in input order.
+        """
+        if not statements_data:
+            return []
+
+        try:
+            statement_ids = db.execute(
+                insert(Statement).returning(Statement.id, sort_by_parameter_order=True),
+                [
+                    {
+                        "address": statement_data.address,
+                        "name": statement_data.name,
+                        "statement_date": statement_data.statement_date,
+                    } for statement_data in statements_data
+                ]
+            ).scalars().all()
+
+            db.execute(insert(StatementDetails), [
+                {"statement_id": statement_id, **statement_data.detail.model_dump()}
+                for statement_id, statement_data in zip(statement_ids, statements_data)
+            ])
+
+            transactions = [
+                {"statement_id": statement_id, **transaction.model_dump()}
+                for statement_id, statement_data in zip(statement_ids, statements_data)
+                for transaction in statement_data.transactions
+            ]
+            if transactions:
+                db.execute(insert(StatementTransaction), transactions)
+
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        return list(statement_ids)
+
+    @staticmethod
+    def append_transactions(statement_id: int, transactions: List[dict], db: Session) -> None:
+        """
+        Add the transactions of a following page to an already persisted statement.
+        """
+        if not transactions:
+            return
+
+        try:
+            db.execute(insert(StatementTransaction), [
+                {"statement_id": statement_id, **StatementTransactionCreate(**transaction).model_dump()}
+                for transaction in transactions
+            ])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+    @staticmethod
+    def add_page(statement_id: int, page_number: int, digest: str, ocr: bytes, db: Session) -> None:
+        """
+        Keep the compressed OCR output of a page of the statement, for StatementCreate.fetch_pages.
+        """
+        try:
+            db.execute(insert(StatementPage), [
+                {"statement_id": statement_id, "page_number": page_number, "digest": digest, "ocr": ocr}
+            ])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+    @staticmethod
+    def fetch_pages(statement_ids: List[int], db: Session) -> Dict[int, List[bytes]]:
+        """
+        The stored OCR output of the pages of each statement, in page order. Statements processed
+        before the pages were stored are missing.
+        """
+        pages: Dict[int, List[bytes]] = {}
+        rows = db.execute(
+            select(StatementPage.statement_id, StatementPage.ocr)
+            .where(StatementPage.statement_id.in_(statement_ids))
+            .order_by(StatementPage.statement_id, StatementPage.page_number)
+        )
+        for statement_id, ocr in rows:
+            pages.setdefault(statement_id, []).append(ocr)
+        return pages
+
+    @staticmethod
+    def fetch(statement_ids: List[int], db: Session) -> Dict[int, "StatementCreate"]:
+        """
+        The stored statements as they were created, by id.
+        """
+        statements = {}
+        rows = db.execute(
+            select(Statement.id, Statement.address, Statement.name, Statement.statement_date,
+                   StatementDetails.total_debit, StatementDetails.total_credit,
+                   StatementDetails.no_debit, StatementDetails.no_credit)
+            .outerjoin(StatementDetails, StatementDetails.statement_id == Statement.id)
+            .where(Statement.id.in_(statement_ids))
+        )
+        for statement_id, address, name, statement_date, total_debit, total_credit, no_debit, no_credit in rows:
+            statements[statement_id] = {
+                "address": address,
+                "name": name,
+                "statement_date": statement_date,
+                "detail": {"total_debit": total_debit, "total_credit": total_credit,
+                           "no_debit": no_debit, "no_credit": no_credit},
+                "transactions": [],
+            }
+
+        rows = db.execute(
+            select(StatementTransaction.statement_id, StatementTransaction.transaction_date, StatementTransaction.amount)
+            .where(StatementTransaction.statement_id.in_(statement_ids))
+            .order_by(StatementTransaction.statement_id, StatementTransaction.id)
+        )
+        for statement_id, transaction_date, amount in rows:
+            statements[statement_id]["transactions"].append({"transaction_date": transaction_date, "amount": amount})
+
+        return {statement_id: StatementCreate(**statement) for statement_id, statement in statements.items()}
+
+    @staticmethod
+    def replace(statement_id: int, statement_data: "StatementCreate", db: Session) -> None:
+        """
+        Overwrite a stored statement in place with a new extraction of it: the statement and detail
+        rows are updated, the transactions replaced. The id and the stored pages stay.
+        """
+        try:
+            db.execute(update(Statement).where(Statement.id == statement_id).values(
+                address=statement_data.address,
+                name=statement_data.name,
+                statement_date=statement_data.statement_date,
+            ))
+            db.execute(update(StatementDetails).where(StatementDetails.statement_id == statement_id)
+                       .values(**statement_data.detail.model_dump()))
+            db.execute(delete(StatementTransaction).where(StatementTransaction.statement_id == statement_id))
+            if statement_data.transactions:
+                db.execute(insert(StatementTransaction), [
+                    {"statement_id": statement_id, **transaction.model_dump()}
+                    for transaction in statement_data.transactions
+                ])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+    @staticmethod
+    def delete(statement_id: int, db: Session) -> None:
+        try:
+            for model in (StatementTransaction, StatementDetails, StatementPage):
+                db.query(model).filter(model.statement_id == statement_id).delete()
+            db.query(Statement).filter(Statement.id == statement_id).delete()
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
 
 class StatementListResponse(BaseModel):
     id: int
     statement_date: datetime
     created_at: datetime
 
+    @staticmethod
+    def encode_cursor(statement_date: datetime, statement_id: int) -> str:
+        cursor = f"{statement_date.isoformat()}|{statement_id}"
+        return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+        try:
+            statement_date, statement_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+            return datetime.fromisoformat(statement_date), int(statement_id)
+        except ValueError:
+            raise ValueError("Invalid cursor")
+
 
 class StatementDetailResponse(BaseModel):
     id: int
@@ -111,3 +286,104 @@ class StatementResponse(BaseModel):
             detail=detail,
             transactions=transactions
         )
+
+    @staticmethod
+    def detail_query(statement_id: int) -> Select:
+        """
+        The statement, its detail and its transactions as plain row tuples in one round trip.
+        """
+        return (
+            select(
+                Statement.id, Statement.address, Statement.name, Statement.statement_date, Statement.created_at,
+                StatementDetails.id, StatementDetails.total_debit, StatementDetails.total_credit,
+                StatementDetails.no_debit, StatementDetails.no_credit,
+                StatementTransaction.id, StatementTransaction.transaction_date, StatementTransaction.amount,
+            )
+            .outerjoin(StatementDetails, StatementDetails.statement_id == Statement.id)
+            .outerjoin(StatementTransaction, StatementTransaction.statement_id == Statement.id)
+            .where(Statement.id == statement_id)
+            .order_by(StatementTransaction.id)
+        )
+
+    @staticmethod
+    def encode_rows(rows: List[Row]) -> Optional[bytes]:
+        """
+        Fast path of serialize: encodes the rows of detail_query with orjson, without building
+        any ORM or Pydantic object.
+        """
+        if not rows:
+            return None
+
+        row = rows[0]
+        return orjson.dumps({
+            "id": row[0],
+            "address": row[1],
+            "name": row[2],
+            "statement_date": row[3],
+            "created_at": row[4],
+            "detail": {
+                "id": row[5],
+                "total_debit": row[6],
+                "total_credit": row[7],
+                "no_debit": row[8],
+                "no_credit": row[9],
+            } if row[5] is not None else None,
+            "transactions": [
+                {"id": row[10], "transaction_date": row[11], "amount": row[12]}
+                for row in rows if row[10] is not None
+            ],
+        })
+
+    @staticmethod
+    def fetch_json(statement_id: int, db: Session) -> Optional[bytes]:
+        return StatementResponse.encode_rows(db.execute(StatementResponse.detail_query(statement_id)).all())
+
+class StatementBatchResult(BaseModel):
+    """
+    One line of the NDJSON body of a batch upload, written as soon as its file is settled.
+    """
+    filename: Optional[str]
+    job_id: Optional[str] = None
+    status: str
+    statement_ids: List[int] = []
+    error: Optional[str] = None
+    warnings: List[str] = []
+
+    @staticmethod
+    def serialize(filename: Optional[str], job) -> "StatementBatchResult":
+        return StatementBatchResult(
+            filename=filename,
+            job_id=job.id,
+            status=job.status,
+            statement_ids=job.statement_ids,
+            error=job.error,
+            warnings=job.warnings,
+        )
+
+
+class StatementJobResponse(BaseModel):
+    id: str
+    status: str
+    attempts: int
+    pages_total: int
+    pages_done: int
+    statement_ids: List[int]
+    error: Optional[str]
+    warnings: List[str]
+    created_at: datetime
+    finished_at: Optional[datetime]
+
+    @staticmethod
+    def serialize(job) -> "StatementJobResponse":
+        return StatementJobResponse(
+            id=job.id,
+            status=job.status,
+            attempts=job.attempts,
+            pages_total=job.pages_total,
+            pages_done=job.pages_done,
+            statement_ids=job.statement_ids,
+            error=job.error,
+            warnings=job.warnings,
+            created_at=job.created_at,
+            finished_at=job.finished_at
+        )
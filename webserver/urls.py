@@ -1,7 +1,8 @@
 from fastapi import APIRouter
 
-from .api import api
+from .api import api, metrics
 
 router = APIRouter()
 
-router.include_router(api.router, prefix='/statements', tags=["statements"])
\ No newline at end of file
+router.include_router(api.router, prefix='/statements', tags=["statements"])
+router.include_router(metrics.router, prefix='/metrics', tags=["metrics"])
\ No newline at end of file
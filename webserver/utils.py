@@ -1,14 +1,25 @@
 import os
 import re
-import pytesseract
-import pandas as pd
+import json
+import zlib
+import importlib
+import tempfile
+import contextvars
+import subprocess
+import numpy as np
+import xml.etree.ElementTree as ET
 
 from .statement.serializers import *
+from .metrics import metrics
+from .ocr import ocr_backend
+from .words import WordTable
 from datetime import datetime
 from abc import ABC, abstractmethod
 from PIL import Image, ImageFile
-from typing import Optional, List, Tuple
-from pdf2image import convert_from_path
+from typing import Optional, List, Tuple, Union, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from pdf2image import convert_from_path, convert_from_bytes, pdfinfo_from_path
+from pdf2image.exceptions import PDFPopplerTimeoutError
 
 class Utils:
     @staticmethod
@@ -28,6 +39,34 @@ class Utils:
             if raise_exception:
                 raise e
 
+    @staticmethod
+    def image_scale(image: Image.Image) -> float:
+        """
+        Ratio between the image DPI and the DPI the bank settings' coordinates are written for.
+        """
+        dpi = image.info.get("dpi")
+        return float(dpi[0]) / RasterProfile.BASE_DPI if dpi else 1.0
+
+    @staticmethod
+    def scale_box(box: Tuple[int, int, int, int], scale: float) -> Tuple[int, int, int, int]:
+        return tuple(round(value * scale) for value in box)
+
+    @staticmethod
+    def image_origin(image: Image.Image) -> Tuple[int, int]:
+        """
+        Position of the image in the full page, in image pixels, when it was cropped by the preprocessing.
+        """
+        return image.info.get("origin", (0, 0))
+
+    @staticmethod
+    def image_box(image: Image.Image, box: Tuple[int, int, int, int]) -> Tuple[int, int, int, int]:
+        """
+        A (left, top, right, bottom) box in base DPI page coordinates, in the pixels of the image.
+        """
+        left, top, right, bottom = Utils.scale_box(box, Utils.image_scale(image))
+        origin_x, origin_y = Utils.image_origin(image)
+        return (max(left - origin_x, 0), max(top - origin_y, 0), max(right - origin_x, 0), max(bottom - origin_y, 0))
+
     @staticmethod
     def largest_smaller(sorted_list: List[int], target: int) -> Optional[int]:
         left, right = 0, len(sorted_list) - 1
@@ -44,8 +83,490 @@ class Utils:
         return result
 
 
+class OcrPage:
+    """
+    Result of a single Tesseract TSV pass over a page.
+
+    The page text is rebuilt from the word boxes (block/par/line grouping), so the
+    bank settings get both the text and the word table without OCR-ing the page again.
+    """
+    def __init__(self, words: WordTable) -> None:
+        self.words = words
+        self.text = OcrPage.build_text(words)
+
+    @classmethod
+    def from_image(cls, image: ImageFile.ImageFile) -> "OcrPage":
+        words = ocr_backend.image_to_data(image)
+        return cls(OcrPage.normalize(words, Utils.image_scale(image), Utils.image_origin(image)))
+
+    @staticmethod
+    def normalize(words: WordTable, scale: float, origin: Tuple[int, int]=(0, 0)) -> WordTable:
+        """
+        Bring the word boxes of an image rendered at any DPI, or cropped at origin, back to the
+        base DPI page coordinates.
+        """
+        if origin != (0, 0):
+            words = words.translate(*origin)
+        return words.scale(scale)
+
+    @staticmethod
+    def build_text(words: WordTable) -> str:
+        """
+        Mirrors the layout of image_to_string: words joined by spaces, lines by a newline
+        and paragraphs/blocks by an empty line.
+        """
+        if not len(words):
+            return ""
+
+        paragraphs, current, previous = [], [], None
+        for (page_num, block_num, par_num, _), line in words.lines():
+            if previous is not None and previous != (page_num, block_num, par_num):
+                paragraphs.append("\n".join(current))
+                current = []
+            current.append(" ".join(line))
+            previous = (page_num, block_num, par_num)
+        paragraphs.append("\n".join(current))
+
+        return "\n\n".join(paragraphs) + "\n"
+
+    def to_json(self) -> str:
+        return json.dumps({"text": self.text, "words": self.words.to_split()})
+
+    @classmethod
+    def from_json(cls, value: str) -> "OcrPage":
+        data = json.loads(value)
+        page = cls(WordTable.from_split(data["words"]))
+        page.text = data["text"]
+        return page
+
+    def to_artifact(self) -> bytes:
+        """
+        The compressed JSON stored along with the statement, see StatementPage.
+        """
+        return zlib.compress(self.to_json().encode(), 6)
+
+    @classmethod
+    def from_artifact(cls, value: bytes) -> "OcrPage":
+        return cls.from_json(zlib.decompress(value).decode())
+
+    def text_in(self, area: Tuple[int, int, int, int]) -> str:
+        """
+        Rebuild the text of the words whose centre falls inside the (left, top, right, bottom) area,
+        equivalent to cropping the area and OCR-ing it again.
+        """
+        return OcrPage.build_text(self.words.within(area, anchor="centre"))
+
+
+class Region:
+    """
+    A region of interest of a bank's page layout and the Tesseract settings to read it with.
+
+    Regions flagged as table share their row numbering (line_num), so words read from separate
+    column crops still line up with each other like they would in a full-page pass.
+    """
+    def __init__(self, name: str, box: Tuple[int, int, int, int], psm: int=6,
+                 whitelist: Optional[str]=None, lang: Optional[str]=None, table: bool=False) -> None:
+        self.name = name
+        self.box = box
+        self.psm = psm
+        self.whitelist = whitelist
+        self.lang = lang
+        self.table = table
+
+    @property
+    def config(self) -> str:
+        config = f"--psm {self.psm}"
+        if self.whitelist:
+            config += f" -c tessedit_char_whitelist={self.whitelist}"
+        return config
+
+
+class RegionOcr:
+    """
+    OCR only the regions of a layout template, concurrently, and merge their words back into a
+    single OcrPage in page coordinates.
+
+    The regions are read on one thread pool per process, kept across pages so that its threads,
+    and the tesserocr APIs each of them holds, live as long as the OCR worker. ExtractionEngine
+    sizes it to the worker's share of the cores.
+    """
+    threads = os.cpu_count() or 1
+    executor: Optional[ThreadPoolExecutor] = None
+
+    def __init__(self, regions: List[Region]) -> None:
+        if not regions:
+            raise ValueError("Layout template has no regions")
+
+        self.regions = regions
+
+    def run(self, image: Image.Image) -> OcrPage:
+        # pool threads don't inherit the caller's context, each region gets its own copy of it
+        contexts = [contextvars.copy_context() for _ in self.regions]
+        tables = list(RegionOcr.pool().map(
+            lambda context, region: context.run(self.__read, image, region), contexts, self.regions
+        ))
+
+        words = WordTable.concat(tables)
+        words = RegionOcr.align_rows(words, [i + 1 for i, region in enumerate(self.regions) if region.table])
+        return OcrPage(words)
+
+    @classmethod
+    def pool(cls) -> ThreadPoolExecutor:
+        if cls.executor is None:
+            cls.executor = ThreadPoolExecutor(max_workers=cls.threads, thread_name_prefix="region-ocr")
+        return cls.executor
+
+    def __read(self, image: Image.Image, region: Region) -> WordTable:
+        box = Utils.image_box(image, region.box)
+        crop = image.crop(box)
+        words = ocr_backend.image_to_data(crop, lang=region.lang, config=region.config)
+        words = OcrPage.normalize(words.translate(box[0], box[1]), Utils.image_scale(image), Utils.image_origin(image))
+        # one block per region, in template order
+        return words.replace(block_num=np.full(len(words), self.regions.index(region) + 1))
+
+    @staticmethod
+    def align_rows(words: WordTable, blocks: List[int]) -> WordTable:
+        """
+        Renumber the lines of the table blocks by vertical position so that the same row has the
+        same line_num across the column crops.
+        """
+        table = np.flatnonzero(np.isin(words.block_num, blocks))
+        if not len(table):
+            return words
+
+        centres = words.top[table] + words.height[table] / 2
+        order = np.argsort(centres, kind="stable")
+        tolerance = np.median(words.height[table]) / 2
+
+        line_num, par_num = words.line_num.copy(), words.par_num.copy()
+        row, row_centre = 0, None
+        for index, centre in zip(table[order], centres[order]):
+            if row_centre is None or centre - row_centre > tolerance:
+                row += 1
+                row_centre = centre
+            line_num[index] = row
+        par_num[table] = 1
+        return words.replace(line_num=line_num, par_num=par_num)
+
+
+class Cell:
+    """
+    An area of a bank's page layout holding one kind of token (amounts, dates, totals): the pattern
+    each of its tokens must match and the characters they are made of. first_page limits the cell
+    to the first page (True) or to the following pages (False), it applies to every page when None.
+    """
+    def __init__(self, name: str, box: Tuple[int, int, int, int], pattern: str, whitelist: str,
+                 first_page: Optional[bool]=None) -> None:
+        self.name = name
+        self.box = box
+        self.pattern = re.compile(pattern)
+        self.whitelist = whitelist
+        self.first_page = first_page
+
+
+class CellVerifier:
+    """
+    Reads again the tokens of the layout cells the full-page pass is unsure of: the ones holding a
+    digit that have a confidence below min_conf or don't match the cell pattern.
+
+    Each token is cropped with some padding, upscaled and OCR'd alone as a single line restricted to
+    the cell characters. The new reading replaces the old one when it matches the pattern and the
+    old one did not, or it is more confident. At most max_tokens tokens, the least confident, are
+    read again per page: a page worse than that needs a whole-page retry instead.
+    """
+    def __init__(self, min_conf: float=80, scale: float=2.0, padding: int=4, max_tokens: int=40) -> None:
+        self.min_conf = min_conf
+        self.scale = scale
+        self.padding = padding
+        self.max_tokens = max_tokens
+
+    def candidates(self, words: WordTable, cells: List[Cell], first_page: bool) -> List[Tuple[int, Cell]]:
+        found = {}
+        for cell in cells:
+            if cell.first_page is not None and cell.first_page != first_page:
+                continue
+            # the words whose top-left corner is in the cell, the box bounds are pixels so right - 1
+            # and bottom - 1 keep them exclusive
+            left, top, right, bottom = cell.box
+            for row in words.rows_within((left, top, right - 1, bottom - 1), anchor="corner").tolist():
+                if row in found:
+                    continue # the first cell holding a token wins
+                text, conf = words.text[row], words.conf[row]
+                if any(char.isdigit() for char in text) and (conf < self.min_conf or not cell.pattern.fullmatch(text)):
+                    found[row] = cell
+
+        worst = sorted(found, key=lambda row: words.conf[row])[:self.max_tokens]
+        return [(row, found[row]) for row in sorted(worst)]
+
+    def run(self, image: Image.Image, page: OcrPage, cells: List[Cell], first_page: bool=True) -> OcrPage:
+        words = page.words
+        rows, texts, confs = [], [], []
+        for row, cell in self.candidates(words, cells, first_page):
+            text, conf = self.read(image, words, row, cell)
+            old_text, old_conf = words.text[row], float(words.conf[row])
+            better = cell.pattern.fullmatch(text) and (not cell.pattern.fullmatch(old_text) or conf > old_conf)
+            metrics.observe("verify", 1, cell=cell.name, result="corrected" if better and text != old_text else "kept")
+            if better:
+                rows.append(row)
+                texts.append(text)
+                confs.append(conf)
+
+        if not rows:
+            return page
+        return OcrPage(words.with_text(np.array(rows), texts, confs))
+
+    def read(self, image: Image.Image, words: WordTable, row: int, cell: Cell) -> Tuple[str, float]:
+        left, top = int(words.left[row]), int(words.top[row])
+        box = (left - self.padding, top - self.padding,
+               left + int(words.width[row]) + self.padding, top + int(words.height[row]) + self.padding)
+        crop = image.crop(Utils.image_box(image, box))
+        if self.scale != 1.0:
+            size = (max(1, round(crop.width * self.scale)), max(1, round(crop.height * self.scale)))
+            crop = crop.resize(size, Image.Resampling.LANCZOS)
+
+        found = ocr_backend.image_to_data(crop, config=f"--psm 7 -c tessedit_char_whitelist={cell.whitelist}")
+        if not len(found):
+            return "", 0.0
+        return "".join(found.text), float(found.conf.min())
+
+
+class RasterProfile:
+    """
+    How a PDF is rasterized: resolution, colour mode, page range, pdftoppm threads, the
+    intermediate image format and the seconds poppler may run before it is killed (None for no
+    limit). Pages outside first_page/last_page are never rendered.
+
+    The bank settings' coordinates are written for BASE_DPI, the DPI is recorded in the image
+    info so the extractor scales them to whatever resolution the page was rendered at.
+    """
+    BASE_DPI = 200
+    MODES = ["RGB", "L", "1"]
+    FORMATS = ["ppm", "png", "jpeg", "tiff"]
+
+    def __init__(self, dpi: int=BASE_DPI, mode: str="RGB", first_page: Optional[int]=None,
+                 last_page: Optional[int]=None, thread_count: int=1, fmt: str="ppm",
+                 timeout: Optional[int]=None) -> None:
+        if dpi < 1 or thread_count < 1:
+            raise ValueError("DPI and thread count must be positive")
+
+        if timeout is not None and timeout < 1:
+            raise ValueError("Timeout must be positive")
+
+        if mode not in self.MODES:
+            raise ValueError(f"Invalid image mode, supports only {self.MODES}")
+
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Invalid image format, supports only {self.FORMATS}")
+
+        if first_page and last_page and first_page > last_page:
+            raise ValueError("First page is after the last page")
+
+        self.dpi = dpi
+        self.mode = mode
+        self.first_page = first_page
+        self.last_page = last_page
+        self.thread_count = thread_count
+        self.fmt = fmt
+        self.timeout = timeout
+
+    def with_overrides(self, **overrides) -> "RasterProfile":
+        values = {key: value for key, value in vars(self).items()}
+        values.update({key: value for key, value in overrides.items() if value is not None})
+        return RasterProfile(**values)
+
+    def options(self) -> dict:
+        return {
+            "dpi": self.dpi,
+            "grayscale": self.mode != "RGB",
+            "first_page": self.first_page,
+            "last_page": self.last_page,
+            "thread_count": self.thread_count,
+            "fmt": self.fmt,
+            "timeout": self.timeout,
+        }
+
+    def key(self) -> str:
+        """
+        The settings the extracted statement depends on: the pages read and how they are rendered.
+        """
+        return f"{self.dpi}:{self.mode}:{self.first_page or 1}:{self.last_page or 0}"
+
+    def page_numbers(self, page_count: int) -> range:
+        """
+        The numbers of the pages read from a PDF of page_count pages, empty when the page window
+        starts past its last page.
+        """
+        first_page = self.first_page or 1
+        last_page = min(self.last_page or page_count, page_count)
+        return range(first_page, last_page + 1)
+
+    def page_pixels(self, page_size: Tuple[float, float]) -> int:
+        """
+        Pixels of a page of page_size points once rendered at this DPI.
+        """
+        width, height = page_size
+        return round(width * self.dpi / 72) * round(height * self.dpi / 72)
+
+    def timed_out(self, stage: str) -> TimeoutError:
+        metrics.observe("timeouts", 1, stage=stage)
+        return TimeoutError(f"Poppler timed out after {self.timeout}s ({stage})")
+
+    def finish(self, images: List[Image.Image]) -> List[Image.Image]:
+        for i, image in enumerate(images):
+            if self.mode == "1":
+                images[i] = image = image.convert("1")
+            image.info["dpi"] = (self.dpi, self.dpi)
+        return images
+
+
+class ImagePreprocessor:
+    """
+    Cleans a page up before OCR so Tesseract reads fewer pixels with cleaner glyphs. The steps
+    always run in this order, each one only when listed:
+
+    - grayscale: drop the colour channels
+    - crop: trim the dark scanner borders and the blank margins around the content
+    - deskew: rotate the page back straight, the angle found from the row profile of the dark pixels
+    - downscale: resample to dpi when the page was rendered at a higher resolution
+    - binarize: adaptive (local mean) threshold, removes background shading and noise
+
+    Cropping and downscaling keep the page coordinates: the DPI and the position of the crop
+    in the page ("origin") are recorded in the image info, see Utils.image_box.
+    """
+    STEPS = ["grayscale", "crop", "deskew", "downscale", "binarize"]
+
+    def __init__(self, steps: Optional[List[str]]=None, dpi: int=150, max_skew: float=5.0,
+                 skew_step: float=0.1, margin: int=10, window: int=31, offset: float=0.15) -> None:
+        steps = list(steps or [])
+        unknown = [step for step in steps if step not in self.STEPS]
+        if unknown:
+            raise ValueError(f"Invalid preprocessing steps {unknown}, supports only {self.STEPS}")
+
+        if dpi < 1 or window < 3:
+            raise ValueError("DPI and binarization window must be positive")
+
+        self.steps = [step for step in self.STEPS if step in steps]
+        self.dpi = dpi
+        self.max_skew = max_skew
+        self.skew_step = skew_step
+        self.margin = margin
+        self.window = window
+        self.offset = offset
+
+    def run(self, image: Image.Image) -> Image.Image:
+        for step in self.steps:
+            with metrics.stage(f"preprocess_{step}"):
+                image = getattr(self, step)(image)
+        return image
+
+    @staticmethod
+    def dark(image: Image.Image, threshold: int=128) -> np.ndarray:
+        return np.asarray(image.convert("L")) < threshold
+
+    def grayscale(self, image: Image.Image) -> Image.Image:
+        return image if image.mode in ("L", "1") else image.convert("L")
+
+    def skew_angle(self, image: Image.Image) -> float:
+        """
+        The text lines are horizontal when the row histogram of the dark pixels is the most peaked.
+        Candidate angles are scored all at once on a sample of the dark pixels, coarse then fine.
+        """
+        ys, xs = np.nonzero(ImagePreprocessor.dark(image))
+        if len(ys) < 100:
+            return 0.0
+        if len(ys) > 50_000:
+            keep = np.random.default_rng(0).choice(len(ys), 50_000, replace=False)
+            ys, xs = ys[keep], xs[keep]
+
+        def __best(angles: np.ndarray) -> float:
+            # rows of the pixels once the page is rotated by each angle, one row of the matrix per angle
+            rows = np.rint(ys[None, :] - xs[None, :] * np.tan(np.radians(angles))[:, None]).astype(np.int64)
+            rows -= rows.min()
+            height = rows.max() + 1
+            counts = np.bincount((rows + np.arange(len(angles))[:, None] * height).ravel(),
+                                 minlength=len(angles) * height)
+            scores = (counts.reshape(len(angles), height).astype(np.float64) ** 2).sum(axis=1)
+            return float(angles[scores.argmax()])
+
+        coarse_step = max(self.skew_step, 0.5)
+        angle = __best(np.arange(-self.max_skew, self.max_skew + coarse_step / 2, coarse_step))
+        return __best(np.arange(angle - coarse_step, angle + coarse_step + self.skew_step / 2, self.skew_step))
+
+    def deskew(self, image: Image.Image) -> Image.Image:
+        angle = self.skew_angle(image)
+        if abs(angle) < self.skew_step:
+            return image
+
+        fill = 255 if image.mode in ("L", "1") else (255,) * len(image.getbands())
+        return image.rotate(angle, resample=Image.Resampling.BILINEAR, fillcolor=fill)
+
+    def crop(self, image: Image.Image) -> Image.Image:
+        dark = ImagePreprocessor.dark(image)
+        # scanner borders: edge rows/columns that are almost entirely dark
+        rows, columns = dark.mean(axis=1) < 0.9, dark.mean(axis=0) < 0.9
+        if not rows.any() or not columns.any():
+            return image
+        top, bottom = rows.argmax(), len(rows) - rows[::-1].argmax()
+        left, right = columns.argmax(), len(columns) - columns[::-1].argmax()
+
+        content = dark[top:bottom, left:right]
+        content_rows, content_columns = np.flatnonzero(content.any(axis=1)), np.flatnonzero(content.any(axis=0))
+        if not len(content_rows):
+            return image
+
+        # the margin never reaches back into the borders
+        box = (
+            max(left + content_columns[0] - self.margin, left),
+            max(top + content_rows[0] - self.margin, top),
+            min(left + content_columns[-1] + 1 + self.margin, right),
+            min(top + content_rows[-1] + 1 + self.margin, bottom),
+        )
+        origin_x, origin_y = Utils.image_origin(image)
+        cropped = image.crop(tuple(int(value) for value in box))
+        cropped.info["origin"] = (origin_x + int(box[0]), origin_y + int(box[1]))
+        return cropped
+
+    def downscale(self, image: Image.Image) -> Image.Image:
+        dpi = Utils.image_scale(image) * RasterProfile.BASE_DPI
+        if dpi <= self.dpi:
+            return image
+
+        factor = self.dpi / dpi
+        origin_x, origin_y = Utils.image_origin(image)
+        resized = image.resize((max(round(image.width * factor), 1), max(round(image.height * factor), 1)),
+                               Image.Resampling.LANCZOS)
+        resized.info["dpi"] = (self.dpi, self.dpi)
+        resized.info["origin"] = (round(origin_x * factor), round(origin_y * factor))
+        return resized
+
+    def binarize(self, image: Image.Image) -> Image.Image:
+        """
+        Bradley's adaptive threshold: a pixel is ink when it is darker than the mean of its
+        window by more than offset, the window sums come from an integral image.
+        """
+        pixels = np.asarray(image.convert("L"), dtype=np.int64)
+        height, width = pixels.shape
+        half = self.window // 2
+
+        integral = np.zeros((height + 1, width + 1), dtype=np.int64)
+        integral[1:, 1:] = pixels.cumsum(axis=0).cumsum(axis=1)
+
+        top = np.clip(np.arange(height) - half, 0, height)[:, None]
+        bottom = np.clip(np.arange(height) + half + 1, 0, height)[:, None]
+        left = np.clip(np.arange(width) - half, 0, width)[None, :]
+        right = np.clip(np.arange(width) + half + 1, 0, width)[None, :]
+
+        sums = integral[bottom, right] - integral[top, right] - integral[bottom, left] + integral[top, left]
+        areas = (bottom - top) * (right - left)
+        ink = pixels * areas < sums * (1 - self.offset)
+
+        binary = Image.fromarray(np.where(ink, 0, 255).astype(np.uint8), mode="L")
+        binary.info = dict(image.info)
+        return binary
+
+
 class PdfToImageConverter:
-    def __init__(self, path: str, target_type: str="PNG") -> None:
+    def __init__(self, path: str, target_type: str="PNG", profile: Optional[RasterProfile]=None) -> None:
         if not path:
             raise ValueError("Invalid or missing file path")
         
@@ -56,88 +577,220 @@ class PdfToImageConverter:
         
         self.path = path
         self.target_type = target_type
+        self.profile = profile or RasterProfile()
         self.converted_path = []
+
+    def to_images(self) -> List[Image.Image]:
+        with metrics.stage("rasterize"):
+            try:
+                return self.profile.finish(convert_from_path(self.path, **self.profile.options()))
+            except PDFPopplerTimeoutError:
+                raise self.profile.timed_out("rasterize") from None
     
     def convert(self) -> List[str]:
-        images = convert_from_path(self.path)
+        images = self.to_images()
         filename = self.path.split(".")[0]
 
         names = []
         for i, image in enumerate(images):
             image_name = f"converted_{filename}_{i + 1}.{self.target_type}"
-            image.save(image_name, self.target_type)
+            image.save(image_name, self.target_type, dpi=image.info["dpi"])
             names.append(image_name)
 
         return names
 
 
-class StatementExtractor:
-    def __init__(self, path: str) -> None:
-        if not path:
-            raise ValueError("Invalid or missing file path")
-        
+class PdfBytesToImageConverter:
+    """
+    In-memory counterpart of PdfToImageConverter: rasterizes the uploaded bytes and hands
+    the PIL images straight to the extractor, nothing is written to the working directory.
+    """
+    def __init__(self, content: bytes, profile: Optional[RasterProfile]=None) -> None:
+        if not content:
+            raise ValueError("Invalid or empty PDF content")
+
+        self.content = content
+        self.profile = profile or RasterProfile()
+
+    def to_images(self) -> List[Image.Image]:
+        with metrics.stage("rasterize"):
+            try:
+                return self.profile.finish(convert_from_bytes(self.content, **self.profile.options()))
+            except PDFPopplerTimeoutError:
+                raise self.profile.timed_out("rasterize") from None
+
+
+class PdfTextLayer:
+    """
+    Reads the embedded text layer of a generated PDF with poppler's pdftotext -bbox-layout and
+    turns every page into the same word table Tesseract produces, scaled to the base raster DPI so
+    the bank settings' coordinates still apply. Pages without a usable text layer (scans) are None.
+
+    Only the page range of the raster profile is read.
+    """
+    NAMESPACE = "{http://www.w3.org/1999/xhtml}"
+    MIN_WORDS = 10
+
+    def __init__(self, source: Union[bytes, str], profile: Optional[RasterProfile]=None) -> None:
+        """
+        source is either the PDF content or the path of a PDF file.
+        """
+        if not source:
+            raise ValueError("Invalid or empty PDF content")
+
+        if isinstance(source, str):
+            Utils.file_exists(source, raise_exception=True)
+
+        self.source = source
+        self.profile = profile or RasterProfile()
+        self.scale = RasterProfile.BASE_DPI / 72
+
+    def pages(self) -> List[Optional[OcrPage]]:
+        command = ["pdftotext", "-bbox-layout", "-enc", "UTF-8"]
+        if self.profile.first_page:
+            command += ["-f", str(self.profile.first_page)]
+        if self.profile.last_page:
+            command += ["-l", str(self.profile.last_page)]
+
+        run = {"capture_output": True, "check": True, "timeout": self.profile.timeout}
+        with metrics.stage("text_layer"):
+            try:
+                if isinstance(self.source, str):
+                    result = subprocess.run(command + [self.source, "-"], **run)
+                else:
+                    with tempfile.NamedTemporaryFile(suffix=".pdf") as pdf:
+                        pdf.write(self.source)
+                        pdf.flush()
+                        result = subprocess.run(command + [pdf.name, "-"], **run)
+            except subprocess.TimeoutExpired:
+                # an OSError, so callers falling back to rasterization on a missing pdftotext do the same
+                raise self.profile.timed_out("text_layer") from None
+
+        try:
+            doc = ET.fromstring(result.stdout)
+        except ET.ParseError as e:
+            raise ValueError(f"Unable to read the PDF text layer: {e}")
+
+        first_page = self.profile.first_page or 1
+        return [
+            self.__page(page, page_num)
+            for page_num, page in enumerate(doc.iter(f"{self.NAMESPACE}page"), start=first_page)
+        ]
+
+    def __page(self, page: ET.Element, page_num: int) -> Optional[OcrPage]:
+        rows = []
+        for block_num, block in enumerate(page.iter(f"{self.NAMESPACE}block"), start=1):
+            for line_num, line in enumerate(block.iter(f"{self.NAMESPACE}line"), start=1):
+                for word_num, word in enumerate(line.iter(f"{self.NAMESPACE}word"), start=1):
+                    left = round(float(word.get("xMin")) * self.scale)
+                    top = round(float(word.get("yMin")) * self.scale)
+                    rows.append({
+                        "level": 5,
+                        "page_num": page_num,
+                        "block_num": block_num,
+                        "par_num": 1,
+                        "line_num": line_num,
+                        "word_num": word_num,
+                        "left": left,
+                        "top": top,
+                        "width": round(float(word.get("xMax")) * self.scale) - left,
+                        "height": round(float(word.get("yMax")) * self.scale) - top,
+                        "conf": 100.0,
+                        "text": word.text or "",
+                    })
+
+        if len(rows) < self.MIN_WORDS:
+            return None
+        # pdftotext numbers the lines within each block and the date and amount columns are separate
+        # blocks: renumber them by vertical position so the words of a row share their line_num
+        words = WordTable.from_rows(rows)
+        return OcrPage(RegionOcr.align_rows(words, np.unique(words.block_num).tolist()))
+
+
+class PdfPageStream:
+    """
+    Yields the pages of a PDF one at a time: from the text layer when the page has one, else
+    rasterized alone through a first_page/last_page window, so a single page is held in memory
+    no matter how many pages the statement has.
+    """
+    def __init__(self, path: str, profile: Optional[RasterProfile]=None, page_count: Optional[int]=None) -> None:
         Utils.file_exists(path, raise_exception=True)
-        self.image = Utils.open_image(path, raise_exception=True)
-        self.SUPPORTED_BANK = ['PUBLIC']
-        
-    def preprocess(self) -> None:
-        self.__image_preprocess()
 
-    def __image_preprocess(self) -> None:
-        # increase sharpness, remove noise etc
-        pass
+        self.path = path
+        self.profile = profile or RasterProfile()
 
-    def __get_bank(self, statement_content: str) -> None:
-        pattern = r'(?i)(\b\w+\b)\s+BANK'
-        matches = re.findall(pattern, statement_content)
+        if page_count is None:
+            page_count = int(pdfinfo_from_path(path, timeout=self.profile.timeout)["Pages"])
+        self.page_numbers = self.profile.page_numbers(page_count)
 
-        if not matches:
-            raise ValueError("Unable to detect the bank name from the statement")
-        
-        # getting the first as logically, the the first X bank will be the statement's bank name
-        self.bank_name = matches[0]
+    def __len__(self) -> int:
+        return len(self.page_numbers)
 
-        if self.bank_name.upper() not in self.SUPPORTED_BANK:
-            raise ValueError(f"Statement of the bank not supported. Currently supports only {self.SUPPORTED_BANK}")
-    
-    def __get_address(self) -> str:
-        return self.setting.get_address(self.image)
+    def __iter__(self) -> Iterator[Union[Image.Image, OcrPage]]:
+        for page_number in self.page_numbers:
+            yield self.read(page_number)
 
-    def __get_statement_date(self, text: str) -> datetime:
-        return self.setting.get_statement_date(text)
-    
-    def __get_total(self, text: str) -> Tuple[float]:
-        return self.setting.get_total(text)
-        
-    def __set_bank_setting(self) -> None:
-        self.setting: BankSetting = {
-            "PUBLIC": PublicBankSetting,
-            "MAYBANK": MayBankSetting,
-        }[self.bank_name]
+    def read(self, page_number: int) -> Union[Image.Image, OcrPage]:
+        window = self.profile.with_overrides(first_page=page_number, last_page=page_number)
+        try:
+            pages = PdfTextLayer(self.path, window).pages()
+        except TimeoutError:
+            # an OSError too, but rasterizing the page would only run into the timeout again
+            raise
+        except (OSError, ValueError, subprocess.CalledProcessError):
+            pages = []
 
-    def __get_transaction(self, text: str, df: pd.DataFrame, statement_date: datetime):
-        return self.setting.get_transaction(text, df, statement_date)
+        if pages and pages[0] is not None:
+            return pages[0]
+        return PdfToImageConverter(self.path, profile=window).to_images()[0]
 
-    # this logic currently only works for first page of PBB statement
-    def extract(self) -> StatementCreate:
+
+class StatementState:
+    """
+    Parsing state carried from one page of a statement to the next: the bank and the header
+    fields read from the first page, the transaction columns and the running transaction date.
+    """
+    def __init__(self) -> None:
+        self.bank_name: Optional[str] = None
+        self.setting: Optional[BankSetting] = None
+        self.address: Optional[str] = None
+        self.statement_date: Optional[datetime] = None
+        self.totals: Tuple = ()
+        self.columns: dict = {}
+        self.last_transaction_date: Optional[datetime] = None
+        self.pages = 0
+        # running sums and counts of the debits and credits read so far, checked against the totals
+        self.sums = {"debit": 0.0, "credit": 0.0}
+        self.counts = {"debit": 0, "credit": 0}
+
+    def add(self, transactions: List[dict]) -> None:
+        for transaction in transactions:
+            kind = "debit" if transaction["amount"] < 0 else "credit"
+            self.sums[kind] += abs(transaction["amount"])
+            self.counts[kind] += 1
+
+    def check(self) -> List[str]:
         """
-        Alternatively, the total, counts, date etc can be done by cropping and OCR.
+        The differences between the transactions read and the totals printed on the statement,
+        none when they add up.
         """
-        self.preprocess()
-        df = pytesseract.image_to_data(self.image, output_type=pytesseract.Output.DATAFRAME)
-        text = pytesseract.image_to_string(self.image)
-        self.__get_bank(text)
-        self.__set_bank_setting()
-        address = self.__get_address()
-        statement_date = self.__get_statement_date(text)
-        total_debit, total_credit, count_debit, count_credit = self.__get_total(text)
-        transactions = self.__get_transaction(text, df, statement_date)
+        total_debit, total_credit, count_debit, count_credit = self.totals
+        issues = []
+        for kind, total, count in (("debit", total_debit, count_debit), ("credit", total_credit, count_credit)):
+            if round(self.sums[kind], 2) != round(total, 2):
+                issues.append(f"The {kind}s read add up to {self.sums[kind]:,.2f}, the statement total is {total:,.2f}")
+            if self.counts[kind] != count:
+                issues.append(f"{self.counts[kind]} {kind}s read, the statement counts {count}")
 
+        metrics.observe("check", 1, result="mismatch" if issues else "match")
+        return issues
 
+    def to_statement(self, transactions: List[dict]) -> StatementCreate:
+        total_debit, total_credit, count_debit, count_credit = self.totals
         return StatementCreate(
-            address=address,
+            address=self.address,
             name=self.bank_name,
-            statement_date=statement_date,
+            statement_date=self.statement_date,
             detail={
                 "total_debit":total_debit,
                 "total_credit":total_credit,
@@ -148,10 +801,184 @@ class StatementExtractor:
         )
 
 
+class StatementExtractor:
+    def __init__(self, source: Union[str, Image.Image, OcrPage], single_pass: bool=True, regions_only: bool=False,
+                 preprocessor: Optional[ImagePreprocessor]=None, verifier: Optional[CellVerifier]=None) -> None:
+        """
+        source is either the path of a page image, an already opened PIL image or an OcrPage
+        read from the PDF text layer, in which case no OCR is run at all.
+
+        single_pass runs one image_to_data pass per page and derives the text and address from
+        the word boxes. Set it to False to fall back to separate image_to_string/crop OCR calls.
+
+        regions_only OCRs only the regions of the bank layout templates instead of the whole page,
+        falling back to a full-page pass when no template matches the page.
+
+        preprocessor cleans the image up before it is OCR'd, none by default.
+
+        verifier reads again the uncertain amount, date and total tokens of the bank's layout cells,
+        none by default.
+        """
+        self.page: Optional[OcrPage] = None
+        if isinstance(source, OcrPage):
+            self.image = None
+            self.page = source
+        elif isinstance(source, Image.Image):
+            self.image = source
+        else:
+            if not source:
+                raise ValueError("Invalid or missing file path")
+
+            Utils.file_exists(source, raise_exception=True)
+            self.image = Utils.open_image(source, raise_exception=True)
+
+        self.single_pass = single_pass
+        self.regions_only = regions_only
+        self.preprocessor = preprocessor
+        self.verifier = verifier
+        self.preprocessed = False
+        self.SUPPORTED_BANK = bank_registry.supported()
+
+    def preprocess(self) -> None:
+        if self.preprocessed:
+            return
+        self.__image_preprocess()
+        self.preprocessed = True
+
+    def __image_preprocess(self) -> None:
+        if self.preprocessor is not None and self.image is not None:
+            self.image = self.preprocessor.run(self.image)
+
+    def __get_bank(self, statement_content: str) -> None:
+        self.bank_name = bank_registry.identify(statement_content)
+
+    def detect_bank(self, statement_content: str) -> str:
+        self.__get_bank(statement_content)
+        return self.bank_name
+
+    def __set_bank_setting(self) -> None:
+        self.setting: BankSetting = bank_registry.load(self.bank_name)
+
+    def __read_regions(self) -> Optional[OcrPage]:
+        for bank_name in self.SUPPORTED_BANK:
+            setting = bank_registry.load(bank_name)
+            if not setting.LAYOUT:
+                continue
+
+            page = RegionOcr(setting.LAYOUT).run(self.image)
+            try:
+                if bank_registry.identify(page.text) != bank_name:
+                    continue # another bank's statement, read through this bank's template
+                setting.get_statement_date(page.text)
+                setting.get_total(page.text)
+            except (ValueError, LookupError):
+                continue # the template does not fit this page
+            self.bank_name = bank_name
+            return page
+
+        return None
+
+    def read(self, first_page: bool=True, bank_name: Optional[str]=None) -> OcrPage:
+        """
+        The word table and text of the page. With regions_only, the header, totals and amounts of a
+        first page are read from the crops of the bank's layout template.
+
+        bank_name picks the layout cells the verifier checks, it is detected from the page text
+        when not given.
+        """
+        if self.page is not None:
+            return self.page
+
+        with metrics.stage("ocr"):
+            page = self.__read(first_page)
+
+        if self.verifier is None:
+            return page
+        with metrics.stage("verify"):
+            return self.__verify(page, first_page, bank_name)
+
+    def __verify(self, page: OcrPage, first_page: bool, bank_name: Optional[str]) -> OcrPage:
+        if bank_name is None:
+            try:
+                bank_name = bank_registry.check(page.text)
+            except ValueError:
+                return page # unsupported bank, rejected by the parse
+            if bank_name is None:
+                return page
+
+        cells = bank_registry.load(bank_name).CELLS
+        if not cells:
+            return page
+        return self.verifier.run(self.image, page, cells, first_page)
+
+    def __read(self, first_page: bool) -> OcrPage:
+        self.preprocess()
+        if self.regions_only and first_page:
+            page = self.__read_regions()
+            if page is not None:
+                return page
+
+        if self.single_pass:
+            return OcrPage.from_image(self.image)
+
+        words = ocr_backend.image_to_data(self.image)
+        page = OcrPage(OcrPage.normalize(words, Utils.image_scale(self.image), Utils.image_origin(self.image)))
+        page.text = ocr_backend.image_to_string(self.image)
+        return page
+
+    def parse(self, page: OcrPage, state: StatementState) -> List[dict]:
+        """
+        Parse one page of a statement and return its transactions. The first page sets the bank
+        and header fields of the state, the following pages only carry on the transactions.
+        """
+        with metrics.stage("parse"):
+            if state.setting is None:
+                # the bank may already be known from the cheap detection on the PDF or header crop
+                self.bank_name = state.bank_name
+                if self.bank_name is None:
+                    with metrics.stage("detect"):
+                        self.__get_bank(page.text)
+                self.__set_bank_setting()
+                # the multi-pass mode reads the address from its own crop of the image
+                address_page = page if self.image is None or self.single_pass else None
+
+                state.bank_name = self.bank_name
+                state.setting = self.setting
+                with metrics.stage("get_address"):
+                    state.address = self.setting.get_address(self.image, address_page)
+                with metrics.stage("get_statement_date"):
+                    state.statement_date = self.setting.get_statement_date(page.text)
+                with metrics.stage("get_total"):
+                    state.totals = self.setting.get_total(page.text)
+
+            with metrics.stage("get_transaction"):
+                transactions = state.setting.get_transaction(page.text, page.words, state.statement_date, state)
+            state.add(transactions)
+            state.pages += 1
+            return transactions
+
+    def extract(self) -> StatementCreate:
+        """
+        Extract a single-page statement.
+        """
+        state = StatementState()
+        transactions = self.parse(self.read(), state)
+        return state.to_statement(transactions)
+
+
 class BankSetting(ABC):
+    # regions of interest read by StatementExtractor(regions_only=True)
+    LAYOUT: List[Region] = []
+    # cells whose uncertain tokens are read again, see CellVerifier
+    CELLS: List[Cell] = []
+
     @staticmethod
     @abstractmethod
-    def get_address(image: ImageFile) -> str: ...
+    def get_address(image: ImageFile, page: Optional[OcrPage]=None) -> str:
+        """
+        page is the single-pass OCR result of the image, when available. Implementations
+        should read the address from its word boxes instead of OCR-ing a crop again.
+        """
     
     @staticmethod
     @abstractmethod
@@ -163,15 +990,43 @@ class BankSetting(ABC):
 
     @staticmethod
     @abstractmethod
-    def get_transaction(text: str, df: pd.DataFrame, statement_date: datetime) -> List[dict]: ...
+    def get_transaction(text: str, words: WordTable, statement_date: datetime,
+                        state: Optional[StatementState]=None) -> List[dict]:
+        """
+        state carries the columns and the running transaction date across the pages of a statement,
+        implementations update it for the next page.
+        """
 
 
 class PublicBankSetting(BankSetting):
+    # address and amount columns are the boxes used below, the header and summary bands
+    # are the parts of the page holding the bank name, statement date and totals
+    LAYOUT = [
+        Region("header", (0, 0, 1654, 300)),
+        Region("address", (200, 300, 580, 450)),
+        Region("rows", (0, 950, 850, 1400), table=True),
+        Region("debits", (850, 950, 1050, 1200), psm=6, whitelist="0123456789.,", table=True),
+        Region("credits", (1050, 950, 1250, 1400), psm=6, whitelist="0123456789.,", table=True),
+        Region("summary", (0, 1400, 1654, 1800)),
+    ]
+    CELLS = [
+        Cell("amount", (850, 150, 1250, 2339), r'[\d,]+\.\d{2}', "0123456789.,"),
+        Cell("date", (0, 950, 250, 2339), r'\d{2}/\d{2}', "0123456789/", first_page=True),
+        Cell("date", (0, 150, 250, 2339), r'\d{2}/\d{2}', "0123456789/", first_page=False),
+        Cell("total", (0, 1400, 1654, 1800), r'[\d,]+(\.\d{2})?', "0123456789.,", first_page=True),
+    ]
+    # x range of the amount columns, and their y range on the first page below the header
+    COLUMNS = {"debit": (850, 1050), "credit": (1050, 1250)}
+    FIRST_PAGE_ROWS = {"debit": (950, 1200), "credit": (950, 1400)}
+
     @staticmethod
-    def get_address(image: ImageFile) -> str:
+    def get_address(image: ImageFile, page: Optional[OcrPage]=None) -> str:
         crop_area = (200, 300, 580, 450)
-        cropped_image = image.crop(crop_area)
-        return pytesseract.image_to_string(cropped_image)
+        if page is not None:
+            return page.text_in(crop_area)
+
+        cropped_image = image.crop(Utils.image_box(image, crop_area))
+        return ocr_backend.image_to_string(cropped_image)
     
     @staticmethod
     def get_statement_date(text: str) -> datetime: 
@@ -206,66 +1061,195 @@ class PublicBankSetting(BankSetting):
         return total_debit, total_credit, count_debit, count_credit
     
     @staticmethod
-    def get_transaction(text: str, df: pd.DataFrame, statement_date: datetime) -> List[dict]:
+    def get_transaction(text: str, words: WordTable, statement_date: datetime,
+                        state: Optional[StatementState]=None) -> List[dict]:
         """
         Hard code to retrieve the debit and credit transactions from the statement due to time constraint.
         
         Better way would be OCR and retrieve the approx x,y of the debit/credits column based on the header, 
         instead of the magic number below.
+
+        On the following pages of a statement, the columns span the whole page height and only amount
+        tokens are kept. Rows above the first date of a page take the last date of the previous page.
         """
-        debits = df[(df["left"] > 850) & (df["left"] < 1050) & (df["top"] > 950) & (df["top"] < 1200)]
-        credits = df[(df["left"] > 1050) & (df["left"] < 1250) & (df["top"] > 950) & (df["top"] < 1400)]
+        first_page = state is None or state.pages == 0
+        columns = state.columns if state is not None and state.columns else PublicBankSetting.COLUMNS
+        if state is not None:
+            state.columns = columns
 
-        transaction_date_pattern = r'^\d{2}/\d{2}$'
-        date_df = df[df['text'].str.contains(transaction_date_pattern, regex=True, na=False)]
-        dates = { row['line_num']: row for _, row in date_df.iterrows() }
-        line_nums = sorted(dates)
+        def __column(name: str) -> WordTable:
+            left, right = columns[name]
+            # the boxes are whole pixels, so left/top strictly inside the bounds is within the bounds shrunk by one
+            if first_page:
+                top, bottom = PublicBankSetting.FIRST_PAGE_ROWS[name]
+                return words.within((left + 1, top + 1, right - 1, bottom - 1), anchor="corner")
+            column = words.within((left + 1, -np.inf, right - 1, np.inf), anchor="corner")
+            return column.matching(r'[\d,]+\.\d{2}')
 
-        def __prepare(tx_df: pd.DataFrame, negative: bool=False) -> None:
-            for _, tx in tx_df.iterrows():
-                line = tx["line_num"]
+        debits = __column("debit")
+        credits = __column("credit")
 
-                transaction_date = dates.get(line)
-                if transaction_date is None:
-                    line = Utils.largest_smaller(line_nums, line)
-                    if line is None:
-                        continue # skip the invalid line
+        date_words = words.matching(r'\d{2}/\d{2}')
+        # one date per line, the last one on a line wins
+        line_nums, last = np.unique(date_words.line_num[::-1], return_index=True)
+        date_words = date_words.take(len(date_words) - 1 - last)
 
-                date = f"{dates.get(line)['text']}/{statement_date.year}"
-                date = datetime.strptime(date, "%d/%m/%Y")
+        # only the dates an amount resolves to are parsed, a stray dd/dd token elsewhere on the page
+        # may not be a date at all; a page repeats the same few dates, each distinct one is parsed once
+        parsed = {}
 
-                amount = float(tx["text"].replace(',', ''))
-                if negative:
-                    amount = -amount 
+        def __date(word: str) -> datetime:
+            if word not in parsed:
+                parsed[word] = datetime.strptime(f"{word}/{statement_date.year}", "%d/%m/%Y")
+            return parsed[word]
 
-                transactions.append({
-                    "transaction_date": date,
-                    "amount": amount
-                }) 
+        # the date carried from the previous page sits before the first line of this one
+        carried_date = state.last_transaction_date if state is not None and not first_page else None
+
+        def __prepare(column: WordTable, negative: bool=False) -> List[dict]:
+            # as-of join on the line number: the date on the same line, else the closest line above
+            positions = np.searchsorted(line_nums, column.line_num, side="right")
+            valid = positions >= (0 if carried_date else 1) # skip the lines without any date above them
+
+            amounts = np.array([float(word.replace(',', '')) for word in column.text[valid]], dtype=np.float64)
+            if negative:
+                amounts = -amounts
+
+            return [
+                {"transaction_date": __date(date_words.text[position - 1]) if position else carried_date, "amount": amount}
+                for position, amount in zip(positions[valid].tolist(), amounts.tolist())
+            ]
+
+        transactions = __prepare(debits, negative=True) + __prepare(credits)
+
+        if state is not None:
+            # the lowest date on the page runs on into the next page
+            for index in np.argsort(-date_words.top, kind="stable").tolist():
+                try:
+                    state.last_transaction_date = __date(date_words.text[index])
+                    break
+                except ValueError:
+                    continue
 
-        transactions = []
-        __prepare(debits, negative=True)
-        __prepare(credits)
-        
         return transactions
 
-class MayBankSetting(BankSetting):
-    @staticmethod
-    def get_address(image: ImageFile) -> str:
-        raise NotImplementedError("Demo class, not implemented yet")
+class BankSignature:
+    """
+    How a bank is recognised on a statement: a pattern matched against the header text, and the
+    "module:Class" path of its BankSetting, imported on first use. Banks without a path are
+    recognised only to reject their statements early.
+    """
+    def __init__(self, name: str, pattern: str, path: Optional[str]=None) -> None:
+        self.name = name
+        self.pattern = re.compile(pattern, re.IGNORECASE)
+        self.path = path
+
+    @property
+    def supported(self) -> bool:
+        return self.path is not None
+
+
+class BankRegistry:
+    """
+    The banks known to the extractor. Detection only runs the signatures, so it can be done on the
+    PDF metadata, the text layer or a small OCR'd header crop before any full-page OCR, and the
+    BankSetting classes are only imported once a statement of their bank shows up.
+    """
+    # where the bank name is printed, in base DPI page coordinates
+    HEADER = (0, 0, 1654, 300)
+
+    def __init__(self) -> None:
+        self.signatures: List[BankSignature] = []
+        self.settings: dict = {}
+
+    def register(self, name: str, pattern: str, path: Optional[str]=None) -> None:
+        self.signatures = [signature for signature in self.signatures if signature.name != name]
+        self.signatures.append(BankSignature(name, pattern, path))
+        self.settings.pop(name, None)
+
+    def supported(self) -> List[str]:
+        return [signature.name for signature in self.signatures if signature.supported]
+
+    def match(self, text: str) -> Optional[BankSignature]:
+        # the bank printed first is the statement's, later ones are e.g. transfer counterparties
+        found = [(match.start(), signature) for signature in self.signatures
+                 for match in [signature.pattern.search(text)] if match]
+        return min(found, key=lambda item: item[0])[1] if found else None
+
+    def check(self, text: str) -> Optional[str]:
+        """
+        The supported bank the text names, None when it names no known bank, raises a ValueError
+        when it names an unsupported one.
+        """
+        signature = self.match(text)
+        if signature is None:
+            return None
+        if not signature.supported:
+            raise ValueError(f"Statement of the bank not supported. Currently supports only {self.supported()}")
+        return signature.name
+
+    def identify(self, text: str) -> str:
+        name = self.check(text)
+        if name is not None:
+            return name
+
+        if re.search(r'(?i)\b\w+\s+BANK\b', text):
+            raise ValueError(f"Statement of the bank not supported. Currently supports only {self.supported()}")
+        raise ValueError("Unable to detect the bank name from the statement")
+
+    def load(self, name: str) -> BankSetting:
+        if name not in self.settings:
+            signature = next((signature for signature in self.signatures if signature.name == name), None)
+            if signature is None or not signature.supported:
+                raise ValueError(f"Statement of the bank not supported. Currently supports only {self.supported()}")
+
+            module, attribute = signature.path.split(":")
+            self.settings[name] = getattr(importlib.import_module(module), attribute)
+        return self.settings[name]
+
+    def from_image(self, image: Image.Image) -> Optional[str]:
+        """
+        check() on the OCR of the header crop of a first page, a fraction of a full-page pass.
+        """
+        crop = image.crop(Utils.image_box(image, self.HEADER))
+        return self.check(ocr_backend.image_to_string(crop))
+
+    def from_pdf(self, path: str, timeout: Optional[int]=None) -> Optional[str]:
+        """
+        check() on the PDF metadata, then on the header of the first page's text layer. No
+        rasterization nor OCR, None when neither names a known bank (e.g. a scan) or poppler
+        runs longer than timeout seconds.
+        """
+        try:
+            info = pdfinfo_from_path(path, timeout=timeout)
+        except Exception:
+            info = {}
+        metadata = " ".join(str(info.get(key, "")) for key in ("Title", "Subject", "Author", "Creator"))
+        name = self.check(metadata)
+        if name is not None:
+            return name
+
+        try:
+            pages = PdfTextLayer(path, RasterProfile(first_page=1, last_page=1, timeout=timeout)).pages()
+        except (OSError, ValueError, subprocess.CalledProcessError):
+            return None
+        if not pages or pages[0] is None:
+            return None
+        return self.check(pages[0].text_in(self.HEADER))
+
+
+bank_registry = BankRegistry()
+bank_registry.register("PUBLIC", r"\bPUBLIC\s+BANK\b", "webserver.utils:PublicBankSetting")
+bank_registry.register("MAYBANK", r"\bMAYBANK\b|\bMALAYAN\s+BANKING\b")
+for name, pattern in (
+    ("CIMB", r"\bCIMB\s+BANK\b"),
+    ("RHB", r"\bRHB\s+BANK\b"),
+    ("HONG LEONG", r"\bHONG\s+LEONG\s+BANK\b"),
+    ("AMBANK", r"\bAMBANK\b"),
+    ("HSBC", r"\bHSBC\s+BANK\b"),
+):
+    bank_registry.register(name, pattern)
 
-    @staticmethod
-    def get_statement_date(text: str) -> datetime:
-        raise NotImplementedError("Demo class, not implemented yet")
-    
-    @staticmethod
-    def get_total(text: str) -> Tuple[float]:
-        raise NotImplementedError("Demo class, not implemented yet")
-    
-    @staticmethod
-    def get_transaction(text: str, df: pd.DataFrame, statement_date: datetime) -> List[dict]:
-        raise NotImplementedError("Demo class, not implemented yet")
-    
 
 if __name__ == "__main__":
     # converter = PdfToImageConverter("test_pdf.pdf")
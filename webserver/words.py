@@ -0,0 +1,251 @@
+import re
+import numpy as np
+
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+class WordTable:
+    """
+    The recognised words of a page, as parallel NumPy columns: the Tesseract line ids
+    (page/block/par/line/word), the box in page pixels, the confidence and the text. Layout rows
+    and empty words are dropped when the table is built, so every row is a word.
+
+    Rectangle queries go through a uniform grid of CELL pixels over the word anchors (top-left
+    corner or centre), built on first use: only the words of the cells overlapping the rectangle
+    are tested. Line queries go through a dict of the rows of each line. Tables are immutable,
+    queries return new tables in the original word order.
+    """
+    COLUMNS = ("page_num", "block_num", "par_num", "line_num", "word_num", "left", "top", "width", "height")
+    LINE_KEYS = ("page_num", "block_num", "par_num", "line_num")
+    TSV_COLUMNS = ("level",) + COLUMNS + ("conf", "text")
+    CELL = 64
+
+    __slots__ = COLUMNS + ("conf", "text", "_grids", "_lines")
+
+    def __init__(self, columns: Dict[str, Sequence], text: Sequence[str], conf: Optional[Sequence[float]]=None) -> None:
+        """
+        columns maps every name of COLUMNS to its values, text and conf are one value per word.
+        """
+        for name in self.COLUMNS:
+            setattr(self, name, np.asarray(columns[name], dtype=np.int32))
+        self.text = np.asarray(text, dtype=object)
+        self.conf = np.asarray(conf if conf is not None else np.full(len(self.text), 100.0), dtype=np.float32)
+        self._grids: Dict[str, tuple] = {}
+        self._lines: Optional[Dict[tuple, np.ndarray]] = None
+
+    @classmethod
+    def empty(cls) -> "WordTable":
+        return cls({name: [] for name in cls.COLUMNS}, [])
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[dict]) -> "WordTable":
+        """
+        Words given as dicts with the TSV column names. Rows with conf -1 (layout rows) or without
+        text are skipped.
+        """
+        columns = {name: [] for name in cls.COLUMNS}
+        text, conf = [], []
+        for row in rows:
+            word = row.get("text")
+            if word is None or word != word or float(row.get("conf", 100)) == -1: # None or NaN
+                continue
+            word = str(word).strip()
+            if not word:
+                continue
+            for name in cls.COLUMNS:
+                columns[name].append(int(row.get(name, 0)))
+            text.append(word)
+            conf.append(float(row.get("conf", 100)))
+        return cls(columns, text, conf)
+
+    @classmethod
+    def from_tsv(cls, tsv: str) -> "WordTable":
+        """
+        Parse the TSV output of Tesseract, with or without its header line.
+        """
+        columns = {name: [] for name in cls.COLUMNS}
+        text, conf = [], []
+        for line in tsv.splitlines():
+            values = line.split("\t", len(cls.TSV_COLUMNS) - 1)
+            if len(values) < len(cls.TSV_COLUMNS) or values[0] == "level":
+                continue
+            word = values[-1].strip()
+            if not word or float(values[-2]) == -1:
+                continue
+            for name, value in zip(cls.COLUMNS, values[1:]):
+                columns[name].append(int(value))
+            text.append(word)
+            conf.append(float(values[-2]))
+        return cls(columns, text, conf)
+
+    @classmethod
+    def concat(cls, tables: List["WordTable"]) -> "WordTable":
+        if not tables:
+            return cls.empty()
+        return cls(
+            {name: np.concatenate([getattr(table, name) for table in tables]) for name in cls.COLUMNS},
+            np.concatenate([table.text for table in tables]),
+            np.concatenate([table.conf for table in tables]),
+        )
+
+    def __getstate__(self) -> dict:
+        # the indexes are rebuilt on demand, only the columns cross process boundaries
+        return {name: getattr(self, name) for name in self.COLUMNS + ("conf", "text")}
+
+    def __setstate__(self, state: dict) -> None:
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._grids = {}
+        self._lines = None
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory held by the columns, text included.
+        """
+        size = sum(getattr(self, name).nbytes for name in self.COLUMNS) + self.conf.nbytes + self.text.nbytes
+        return size + sum(len(word) + 49 for word in self.text) # str objects
+
+    def take(self, rows: np.ndarray) -> "WordTable":
+        """
+        The words at the given positions, or where the boolean mask is set.
+        """
+        return WordTable({name: getattr(self, name)[rows] for name in self.COLUMNS}, self.text[rows], self.conf[rows])
+
+    def replace(self, **columns: np.ndarray) -> "WordTable":
+        """
+        A copy with some of the COLUMNS replaced, e.g. boxes moved or lines renumbered.
+        """
+        values = {name: columns.get(name, getattr(self, name)) for name in self.COLUMNS}
+        return WordTable(values, self.text, self.conf)
+
+    def with_text(self, rows: np.ndarray, text: List[str], conf: List[float]) -> "WordTable":
+        """
+        A copy with the text and confidence of the words at the given positions replaced.
+        """
+        new_text, new_conf = self.text.copy(), self.conf.copy()
+        new_text[rows] = text
+        new_conf[rows] = conf
+        return WordTable({name: getattr(self, name) for name in self.COLUMNS}, new_text, new_conf)
+
+    def translate(self, x: int, y: int) -> "WordTable":
+        return self.replace(left=self.left + x, top=self.top + y)
+
+    def scale(self, scale: float) -> "WordTable":
+        """
+        Divide the boxes by scale, rounded to whole pixels.
+        """
+        if scale == 1.0:
+            return self
+        return self.replace(**{name: np.rint(getattr(self, name) / scale) for name in ("left", "top", "width", "height")})
+
+    def matching(self, pattern: str) -> "WordTable":
+        """
+        The words whose whole text matches the regular expression.
+        """
+        regex = re.compile(pattern)
+        return self.take(np.fromiter((regex.fullmatch(word) is not None for word in self.text), dtype=bool, count=len(self)))
+
+    def __anchor(self, anchor: str) -> Tuple[np.ndarray, np.ndarray]:
+        if anchor == "corner":
+            return self.left, self.top
+        if anchor == "centre":
+            return self.left + self.width / 2, self.top + self.height / 2
+        raise ValueError("Invalid anchor, supports only corner and centre")
+
+    def __grid(self, anchor: str) -> tuple:
+        if anchor not in self._grids:
+            x, y = self.__anchor(anchor)
+            cell_x = np.maximum(x // self.CELL, 0).astype(np.int64)
+            cell_y = np.maximum(y // self.CELL, 0).astype(np.int64)
+            width = int(cell_x.max()) + 1
+            cells = cell_y * width + cell_x
+            order = np.argsort(cells, kind="stable")
+            self._grids[anchor] = (x, y, width, int(cell_y.max()) + 1, cells[order], order)
+        return self._grids[anchor]
+
+    def within(self, area: Tuple[float, float, float, float], anchor: str="centre") -> "WordTable":
+        """
+        The words whose anchor, top-left corner or centre, falls inside the (left, top, right, bottom)
+        area, bounds included. Bounds may be infinite.
+        """
+        if not len(self):
+            return self
+        return self.take(self.rows_within(area, anchor))
+
+    def rows_within(self, area: Tuple[float, float, float, float], anchor: str="centre") -> np.ndarray:
+        """
+        The sorted row indices of the words within(area, anchor) returns.
+        """
+        if not len(self):
+            return np.zeros(0, dtype=np.int64)
+
+        x, y, width, height, cells, order = self.__grid(anchor)
+        left, top, right, bottom = area
+        first_x, last_x = self.__cell_range(left, right, width)
+        first_y, last_y = self.__cell_range(top, bottom, height)
+        if first_x > last_x or first_y > last_y:
+            return np.zeros(0, dtype=np.int64)
+
+        # one contiguous run of the sorted cell ids per grid row
+        rows = np.arange(first_y, last_y + 1) * width
+        starts = np.searchsorted(cells, rows + first_x, side="left")
+        ends = np.searchsorted(cells, rows + last_x, side="right")
+        candidates = np.concatenate([order[start:end] for start, end in zip(starts, ends)])
+
+        inside = (x[candidates] >= left) & (x[candidates] <= right) & (y[candidates] >= top) & (y[candidates] <= bottom)
+        return np.sort(candidates[inside])
+
+    def __cell_range(self, low: float, high: float, cells: int) -> Tuple[int, int]:
+        first = 0 if low == -np.inf else max(int(low // self.CELL), 0)
+        last = cells - 1 if high == np.inf else min(int(high // self.CELL), cells - 1)
+        return first, last
+
+    def line_ids(self) -> List[tuple]:
+        """
+        The (page_num, block_num, par_num, line_num) of every line, in reading order.
+        """
+        return list(self.__line_index())
+
+    def on_line(self, line_id: tuple) -> "WordTable":
+        rows = self.__line_index().get(tuple(line_id))
+        return self.take(rows if rows is not None else np.zeros(0, dtype=np.int64))
+
+    def __line_index(self) -> Dict[tuple, np.ndarray]:
+        if self._lines is None:
+            keys = [getattr(self, name) for name in self.LINE_KEYS]
+            # lexsort is stable: lines in key order, words in their original order within a line
+            order = np.lexsort(keys[::-1])
+            sorted_keys = np.stack([key[order] for key in keys], axis=1)
+            breaks = np.flatnonzero((sorted_keys[1:] != sorted_keys[:-1]).any(axis=1)) + 1
+            starts = np.concatenate(([0], breaks)) if len(order) else breaks
+            ends = np.append(breaks, len(order))
+            self._lines = {
+                tuple(key): order[start:end]
+                for key, start, end in zip(sorted_keys[starts].tolist(), starts.tolist(), ends.tolist())
+            }
+        return self._lines
+
+    def lines(self) -> Iterator[Tuple[tuple, List[str]]]:
+        """
+        (line id, words) of every line, in reading order.
+        """
+        for line_id, rows in self.__line_index().items():
+            yield line_id, self.text[rows].tolist()
+
+    def to_split(self) -> dict:
+        """
+        Column names and rows, the layout of a DataFrame's to_json(orient="split").
+        """
+        columns = list(self.COLUMNS) + ["conf", "text"]
+        data = [[int(getattr(self, name)[i]) for name in self.COLUMNS] + [float(self.conf[i]), self.text[i]]
+                for i in range(len(self))]
+        return {"columns": columns, "data": data}
+
+    @classmethod
+    def from_split(cls, value: dict) -> "WordTable":
+        columns = value["columns"]
+        return cls.from_rows(dict(zip(columns, row)) for row in value["data"])